@@ -0,0 +1,426 @@
+# Offline benchmarks for main.py. Completions go to a local stand-in for the
+# OpenAI-compatible endpoint and embeddings come from a deterministic fake, so no
+# Ollama server or GGUF model is needed.
+#
+#   python benchmark.py --output bench.json
+#   python benchmark.py --quick --compare bench.json
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import argparse
+import threading
+import platform
+import tempfile
+import hashlib
+import shutil
+import time
+import json
+import os
+import re
+import subprocess
+import sys
+
+import main
+from main import (
+    Agent, ModelRegistry, NERExtractionTool, Resources, SemanticAnalysisTool, SemanticFileSearchTool,
+    Squad, Task, TextChunker, TextReaderTool, Word2VecSearchTool
+)
+
+EMBED_MODEL = "benchmark-embed"
+ENTITY_NAMES = ["Alice Johnson", "Bob Smith", "Carol White", "Paris", "Berlin", "Tokyo", "Acme Corp", "Globex", "Initech"]
+# Opinionated prose for the sentiment parity check; the synthetic corpus has no lexicon words.
+SENTIMENT_PROSE = [
+    "It isn't good. This wasn't bad either, and the ending is really not that terrible.",
+    "The service was very, very slow! I don't think I'll come back, although the food was great.",
+    "Mr. Smith said the results were not a surprise, e.g. the best runs were hardly better than average.",
+    "What a wonderful day :) The hotel, however, was dirty and the staff never helped...",
+    "I can't say it's perfect (!) but it is pretty nice.\n\nHonestly ; ) the price is extremely fair.",
+    "\"Absolutely awful,\" she wrote. \"Not recommended.\" Others found it quite enjoyable!!"
+]
+
+class StubCompletionHandler(BaseHTTPRequestHandler):
+    # Stand-in for /v1/chat/completions. Replies are derived from the prompt hash
+    # and take latency + completion_tokens / tokens_per_sec seconds to arrive.
+    latency = 0.05
+    tokens_per_sec = 200.0
+    completion_tokens = 64
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            # e.g. Agent.prewarm hitting /api/generate
+            return self.send_json({"done": True})
+
+        prompt = "".join(message.get("content") or "" for message in body.get("messages", []))
+        seed = int(hashlib.sha256(prompt.encode()).hexdigest()[:8], 16)
+        tokens = [f"word{(seed + i * 7919) % 5000} " for i in range(self.completion_tokens)]
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(tokens), "total_tokens": len(prompt) // 4 + len(tokens)}
+        time.sleep(self.latency)
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for token in tokens:
+                time.sleep(1.0 / self.tokens_per_sec)
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": body.get("model"), "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            if (body.get("stream_options") or {}).get("include_usage"):
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": body.get("model"), "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+            return
+
+        time.sleep(len(tokens) / self.tokens_per_sec)
+        self.send_json({
+            "id": "stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    def send_json(self, payload: Dict[str, Any]):
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer:
+    def __init__(self, latency: float = 0.05, tokens_per_sec: float = 200.0, completion_tokens: int = 64, port: int = 0):
+        handler = type("Handler", (StubCompletionHandler,), {"latency": latency, "tokens_per_sec": tokens_per_sec, "completion_tokens": completion_tokens})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def __enter__(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+class FakeEmbedder:
+    # Deterministic stand-in for Embed4All: a signed hashed bag of words, so texts
+    # sharing words get similar vectors and search results stay meaningful.
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+        self.buckets: Dict[str, tuple] = {}
+
+    def bucket(self, token: str) -> tuple:
+        if token not in self.buckets:
+            value = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            self.buckets[token] = (value % self.dim, 1.0 if (value >> 32) & 1 else -1.0)
+        return self.buckets[token]
+
+    def embed(self, text, prefix: Optional[str] = None, **kwargs):
+        texts = [text] if isinstance(text, str) else list(text)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, item in enumerate(texts):
+            for token in re.findall(r"\w+", item.lower()):
+                index, sign = self.bucket(token)
+                vectors[row, index] += sign
+        return vectors[0].tolist() if isinstance(text, str) else vectors.tolist()
+
+class ByteEncoding:
+    # Used when tiktoken cannot fetch cl100k_base offline; one token per utf-8 byte.
+    name = "bytes"
+
+    def encode(self, text: str, **kwargs) -> List[int]:
+        return list(text.encode("utf-8", "surrogatepass"))
+
+    def decode(self, tokens: List[int]) -> str:
+        return bytes(tokens).decode("utf-8", "replace")
+
+def install_fakes(dim: int = 768) -> Dict[str, str]:
+    ModelRegistry.models[("embed4all", EMBED_MODEL)] = FakeEmbedder(dim)
+    environment = {"embedder": "FakeEmbedder"}
+
+    try:
+        environment["encoding"] = ModelRegistry.encoding().name
+    except Exception:
+        ModelRegistry.models[("tiktoken", "cl100k_base")] = ByteEncoding()
+        environment["encoding"] = ByteEncoding.name
+
+    try:
+        NERExtractionTool().nlp
+        environment["ner_pipeline"] = "en_core_web_sm"
+    except Exception:
+        # no trained model installed: a rule-based pipeline still exercises the batching path
+        import spacy
+        nlp = spacy.blank("en")
+        ruler = nlp.add_pipe("entity_ruler")
+        ruler.add_patterns([{"label": "ENT", "pattern": name} for name in ENTITY_NAMES])
+        ModelRegistry.models[("spacy-ner", "en_core_web_sm")] = nlp
+        environment["ner_pipeline"] = "blank+entity_ruler"
+    return environment
+
+def make_corpus(directory: str, words: int, files: int = 4, seed: int = 0) -> List[str]:
+    # Zipf-distributed vocabulary in sentences of 8-20 words, with some names mixed in for NER.
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"term{i}" for i in range(5000)])
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(files):
+        ids = (rng.zipf(1.3, size=words // files) - 1) % len(vocabulary)
+        tokens = vocabulary[ids].tolist()
+        sentences, position = [], 0
+        while position < len(tokens):
+            length = int(rng.integers(8, 21))
+            sentence = tokens[position:position + length]
+            if rng.random() < 0.3:
+                sentence.insert(int(rng.integers(0, len(sentence) + 1)), ENTITY_NAMES[int(rng.integers(len(ENTITY_NAMES)))])
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            position += length
+        path = os.path.join(directory, f"corpus_{words}_{index}.txt")
+        with open(path, "w") as file:
+            file.write("\n".join(" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)))
+        paths.append(path)
+    return paths
+
+def sample_sentences(paths: List[str], count: int, seed: int = 0) -> List[str]:
+    sentences = [sentence.strip() for path in paths for sentence in open(path).read().split(".") if sentence.strip()]
+    rng = np.random.default_rng(seed)
+    return [sentences[i] for i in rng.choice(len(sentences), size=min(count, len(sentences)), replace=False)]
+
+def measure(fn: Callable[[], Any], repeat: int = 5, warmup: int = 1, setup: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {"repeat": repeat, "min_s": timings[0], "median_s": timings[len(timings) // 2], "mean_s": sum(timings) / len(timings), "max_s": timings[-1]}
+
+def result(name: str, params: Dict[str, Any], timing: Dict[str, float], **rates) -> Dict[str, Any]:
+    return {"name": name, "params": params, **timing, **{key: value / timing["median_s"] for key, value in rates.items()}}
+
+def clear_caches():
+    with TextChunker.cache_lock:
+        TextChunker.token_cache.clear()
+        TextChunker.token_cache_size = 0
+    NERExtractionTool.entity_cache.clear()
+    SemanticAnalysisTool.sentiment_cache.clear()
+
+def bench_chunk_text(text: str, sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    for size in sizes:
+        chunker = TextChunker(text[:size], chunk_size=500)
+        params = {"chars": size, "chunk_size": 500}
+        results.append(result("chunk_text", params, measure(chunker.chunk_text, repeat, setup=clear_caches), chars_per_s=size))
+        results.append(result("chunk_text_cached", params, measure(chunker.chunk_text, repeat), chars_per_s=size))
+    return results
+
+def bench_semantic_search(paths: List[str], workdir: str, words: int, queries: List[str], repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    for mode in ("dense", "ann", "hybrid"):
+        index_name = os.path.join(workdir, f"index_{words}_{mode}")
+        params = {"words": words, "mode": mode, "queries": len(queries)}
+
+        def build():
+            shutil.rmtree(index_name, ignore_errors=True)
+            return SemanticFileSearchTool([Resources("text", path) for path in paths], EMBED_MODEL, chunk_size=500, top_k=5, index_name=index_name, ann=mode == "ann", hybrid=mode == "hybrid")
+        results.append(result("semantic_index_build", params, measure(build, 1, warmup=0), words_per_s=words))
+
+        tool = build()
+        params["chunks"] = len(tool.store)
+        results.append(result("semantic_search", params, measure(lambda: [tool.search(query) for query in queries], repeat), queries_per_s=len(queries)))
+        results.append(result("semantic_search_batch", params, measure(lambda: tool.search_batch(queries), repeat), queries_per_s=len(queries)))
+    return results
+
+def bench_word2vec(paths: List[str], workdir: str, words: int, queries: List[str], repeat: int) -> List[Dict[str, Any]]:
+    model_name = os.path.join(workdir, f"word2vec_{words}")
+    params = {"words": words, "queries": len(queries)}
+
+    def build():
+        for suffix in (".pickle", ".json"):
+            if os.path.exists(model_name + suffix):
+                os.remove(model_name + suffix)
+        return Word2VecSearchTool([Resources("text", path) for path in paths], embedding_size=100, workers=1, model_name=model_name)
+    results = [result("word2vec_train", params, measure(build, 1, warmup=0), words_per_s=words)]
+
+    tool = build()
+    # queries are corpus sentences, so an empty result means the index is broken rather than the query unlucky
+    if not all(tool.search(query) for query in queries):
+        raise RuntimeError(f"word2vec search returned no results over {len(tool.chunk_meta)} indexed sentences")
+    params["chunks"] = len(tool.chunk_meta)
+    results.append(result("word2vec_search", params, measure(lambda: [tool.search(query) for query in queries], repeat), queries_per_s=len(queries)))
+    return results
+
+def bench_ner(texts: List[str], repeat: int) -> List[Dict[str, Any]]:
+    tool = NERExtractionTool()
+    params = {"texts": len(texts)}
+    return [
+        result("ner_batch", params, measure(lambda: tool.extract_entities_batch(texts), repeat, setup=clear_caches), texts_per_s=len(texts)),
+        result("ner_batch_cached", params, measure(lambda: tool.extract_entities_batch(texts), repeat), texts_per_s=len(texts))
+    ]
+
+def check_sentiment_parity(tool: SemanticAnalysisTool, texts: List[str]):
+    from textblob import TextBlob
+    batch = tool.analyze_sentiment_batch(texts)["scores"]
+    for text, score in zip(texts, batch):
+        expected = TextBlob(text).sentiment
+        if abs(score["polarity"] - expected.polarity) > 1e-9 or abs(score["subjectivity"] - expected.subjectivity) > 1e-9:
+            raise RuntimeError(f"batch sentiment {score} differs from TextBlob {expected} for {text!r}")
+
+def bench_sentiment(texts: List[str], repeat: int) -> List[Dict[str, Any]]:
+    tool = SemanticAnalysisTool()
+    check_sentiment_parity(tool, SENTIMENT_PROSE + texts[:50])
+    params = {"texts": len(texts)}
+    single = texts[:50]
+    return [
+        result("sentiment_batch", params, measure(lambda: tool.analyze_sentiment_batch(texts), repeat, setup=clear_caches), texts_per_s=len(texts)),
+        result("sentiment_batch_cached", params, measure(lambda: tool.analyze_sentiment_batch(texts), repeat), texts_per_s=len(texts)),
+        result("sentiment_textblob", {"texts": len(single)}, measure(lambda: [tool.analyze_sentiment(text) for text in single], repeat, setup=clear_caches), texts_per_s=len(single))
+    ]
+
+def bench_squad(paths: List[str], workdir: str, words: int, server: StubServer, tasks: int, repeat: int, max_workers: int = 1) -> Dict[str, Any]:
+    resources = [Resources("text", path) for path in paths]
+    tools = {
+        "reader": TextReaderTool(resources[0], chunk_size=500, num_chunks=3),
+        "search": SemanticFileSearchTool(resources, EMBED_MODEL, chunk_size=500, top_k=5, index_name=os.path.join(workdir, f"squad_index_{words}"))
+    }
+
+    def run():
+        agents = [Agent(role=f"agent {i}", goal="benchmark", tools=tools, model=f"bench-model-{i % 2}", base_url=server.base_url, cache=False) for i in range(2)]
+        plan = [Task("Read the corpus", "notes", agent=agents[0], tool_name="reader")]
+        plan.append(Task("Search the corpus", "passages", agent=agents[1], tool_name="search", context=[plan[0]]))
+        # the remaining tasks fan out from the search, so max_workers > 1 can overlap them
+        while len(plan) < tasks:
+            plan.append(Task(f"Summarise part {len(plan)}", "summary", agent=agents[len(plan) % 2], context=[plan[1]]))
+        squad = Squad(agents, plan, log_file=os.path.join(workdir, "squad_log.jsonl"), max_workers=max_workers, interaction_log=os.path.join(workdir, "qa_interactions.jsonl"))
+        squad.run()
+
+    timing = measure(run, repeat)
+    return result("squad_run", {"words": words, "tasks": tasks, "max_workers": max_workers}, timing, tasks_per_s=tasks)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    environment = install_fakes(args.embed_dim)
+    workdir = tempfile.mkdtemp(prefix="meeseeks_bench_")
+    results = []
+    try:
+        with StubServer(args.latency, args.tokens_per_sec, args.completion_tokens) as server:
+            for words in args.sizes:
+                paths = make_corpus(os.path.join(workdir, f"corpus_{words}"), words)
+                queries = sample_sentences(paths, args.queries)
+                if args.verbose:
+                    print(f"Corpus of {words} words", file=sys.stderr)
+
+                if words == args.sizes[0]:
+                    text = "\n".join(open(path).read() for path in paths)
+                    results.extend(bench_chunk_text(text, [len(text) // 4, len(text)], args.repeat))
+                    texts = sample_sentences(paths, args.texts, seed=1)
+                    results.extend(bench_ner(texts, args.repeat))
+                    results.extend(bench_sentiment(texts, args.repeat))
+
+                results.extend(bench_semantic_search(paths, workdir, words, queries, args.repeat))
+                results.extend(bench_word2vec(paths, workdir, words, queries, args.repeat))
+                for max_workers in (1, 4):
+                    results.append(bench_squad(paths, workdir, words, server, args.tasks, max(1, args.repeat // 2), max_workers))
+
+        if args.startup:
+            startup = main.measure_startup(3)
+            results.append({"name": "startup", "params": {}, "repeat": startup["runs"], "min_s": startup["min_s"], "median_s": startup["median_s"], "max_s": startup["max_s"]})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            **environment
+        },
+        "results": results
+    }
+
+def result_key(entry: Dict[str, Any]) -> str:
+    return f"{entry['name']} {json.dumps(entry['params'], sort_keys=True)}"
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 1.1) -> List[Dict[str, Any]]:
+    # median time ratios, current / baseline; above threshold counts as a regression
+    previous = {result_key(entry): entry for entry in baseline["results"]}
+    rows = []
+    for entry in current["results"]:
+        old = previous.get(result_key(entry))
+        if old and old["median_s"] > 0:
+            ratio = entry["median_s"] / old["median_s"]
+            rows.append({"benchmark": result_key(entry), "baseline_s": old["median_s"], "current_s": entry["median_s"], "ratio": ratio, "regression": ratio > threshold})
+    return rows
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline MeeseeksAI benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", help="synthetic corpus sizes in words")
+    parser.add_argument("--quick", action="store_true", help="small corpora and fewer repeats")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--texts", type=int, default=200, help="texts per NER/sentiment batch")
+    parser.add_argument("--tasks", type=int, default=6, help="tasks per end-to-end squad")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub completion latency in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--embed-dim", type=int, default=768)
+    parser.add_argument("--startup", action="store_true", help="also measure module import time")
+    parser.add_argument("--output", help="write results as JSON here instead of stdout")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.1, help="median time ratio counted as a regression")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    if not args.sizes:
+        args.sizes = [5_000, 20_000] if args.quick else [10_000, 50_000, 200_000]
+    if args.quick:
+        args.repeat = min(args.repeat, 3)
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_benchmarks(args)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as file:
+            rows = compare(json.load(file), report, args.threshold)
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['ratio']:6.2f}x  {row['benchmark']}  {flag}", file=sys.stderr)
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
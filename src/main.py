@@ -1,62 +1,288 @@
-from typing import Any, Callable, Dict, List, Optional
-from tiktoken import get_encoding
-from bs4 import BeautifulSoup
-from gpt4all import Embed4All
-from textblob import TextBlob
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
 from datetime import datetime
-from openai import OpenAI
-from gensim.models import Word2Vec
-from gensim.models.word2vec import LineSentence
 from io import StringIO
+from urllib.parse import urlencode, urljoin
+from itertools import count, islice
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 import numpy as np
 import requests
+import asyncio
+import threading
+import queue
+import gzip
+import weakref
+import time
 import hashlib
 import json
 import uuid
-import spacy
 import pickle
-import PyPDF2
+import shutil
+import mmap
 import os
 import re
 import csv
+import subprocess
+import sys
+
+if TYPE_CHECKING:
+    # annotations only; the modules themselves are imported where they are used
+    from gensim.models import Word2Vec
+    from openai import AsyncOpenAI, OpenAI
+
+class ModelRegistry:
+    # Heavy libraries (spaCy, gpt4all, tiktoken, ...) are imported and their models
+    # loaded on first use, then shared by every tool in the process.
+    models: Dict[tuple, Any] = {}
+    loading: Dict[tuple, threading.Lock] = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def get(cls, key: tuple, loader: Callable[[], Any]) -> Any:
+        with cls.lock:
+            if key in cls.models:
+                return cls.models[key]
+            key_lock = cls.loading.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in cls.models:
+                model = loader()
+                with cls.lock:
+                    cls.models[key] = model
+        return cls.models[key]
+
+    @classmethod
+    def embedder(cls, model_name: str) -> Any:
+        def load():
+            from gpt4all import Embed4All
+            return Embed4All(model_name)
+        return cls.get(("embed4all", model_name), load)
+
+    @classmethod
+    def encoding(cls, name: str = "cl100k_base") -> Any:
+        def load():
+            from tiktoken import get_encoding
+            return get_encoding(name)
+        return cls.get(("tiktoken", name), load)
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "thread")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.thread = threading.get_ident()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        if self.attrs.get("completion_tokens"):
+            self.attrs["tokens_per_sec"] = self.attrs["completion_tokens"] / max(self.duration, 1e-9)
+        Tracer.record(self)
+        return False
+
+    @property
+    def duration(self) -> float:
+        return (self.end - self.start) / 1e9
+
+class NullSpan:
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+class Tracer:
+    # Process-wide span recorder. While disabled, span() hands back one shared
+    # no-op object, so instrumented code only pays a flag check and a call.
+    enabled = False
+    spans: List[Span] = []
+    origin_ns = 0
+    origin_time = 0.0
+    null_span = NullSpan()
+    lock = threading.Lock()
+
+    @classmethod
+    def span(cls, name: str, **attrs) -> Any:
+        if not cls.enabled:
+            return cls.null_span
+        return Span(name, attrs)
+
+    @classmethod
+    def enable(cls):
+        with cls.lock:
+            cls.spans = []
+            cls.origin_ns = time.perf_counter_ns()
+            cls.origin_time = time.time()
+            cls.enabled = True
+
+    @classmethod
+    def disable(cls):
+        cls.enabled = False
+
+    @classmethod
+    def record(cls, span: Span):
+        with cls.lock:
+            cls.spans.append(span)
+
+    @classmethod
+    def export_jsonl(cls, path: str):
+        with cls.lock:
+            spans = list(cls.spans)
+        with open(path, "w") as file:
+            for span in spans:
+                file.write(json.dumps({
+                    "name": span.name,
+                    "timestamp": datetime.fromtimestamp(cls.origin_time + (span.start - cls.origin_ns) / 1e9).isoformat(),
+                    "duration_s": span.duration,
+                    "thread": span.thread,
+                    **span.attrs
+                }, default=str) + "\n")
+
+    @classmethod
+    def export_chrome(cls, path: str):
+        # trace-event format, loadable in chrome://tracing and Perfetto
+        with cls.lock:
+            spans = list(cls.spans)
+        events = [{
+            "name": span.name,
+            "cat": span.name,
+            "ph": "X",
+            "ts": (span.start - cls.origin_ns) / 1000,
+            "dur": (span.end - span.start) / 1000,
+            "pid": os.getpid(),
+            "tid": span.thread,
+            "args": span.attrs
+        } for span in spans]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, default=str)
 
 class Resources:
-    def __init__(self, resource_type: str, resource_path: str, context_template: str = None):
+    def __init__(self, resource_type: str, resource_path: str, context_template: str = None, cache_dir: str = ".resource_cache", pdf_workers: Optional[int] = None, max_bytes: Optional[int] = 5 * 1024 * 1024, raw_html: bool = False):
         self.resource_type = resource_type
         self.resource_path = resource_path
         self.context_template = context_template
-        self.data = self.load_resource()
+        self.cache_dir = cache_dir
+        self.pdf_workers = pdf_workers or os.cpu_count() or 1
+        self.max_bytes = max_bytes
+        self.raw_html = raw_html
         self.chunks = []
+        self._data = None
+        self.load_lock = threading.Lock()
+
+    @property
+    def data(self) -> str:
+        # loaded on first use, so resources no task touches cost nothing
+        if self._data is None:
+            with self.load_lock:
+                if self._data is None:
+                    self._data = self.load_resource()
+        return self._data
 
     def load_resource(self):
-        if self.resource_type == 'text':
-            return self.load_text()
-        elif self.resource_type == 'pdf':
-            return self.load_pdf()
-        elif self.resource_type == 'web':
-            return self.load_web()
-        else:
-            raise ValueError(f"Unsupported resource type: {self.resource_type}")
+        with Tracer.span("load_resource", type=self.resource_type, path=self.resource_path) as span:
+            if self.resource_type == 'text':
+                data = self.load_text()
+            elif self.resource_type == 'pdf':
+                data = self.load_pdf()
+            elif self.resource_type == 'web':
+                data = self.load_web()
+            else:
+                raise ValueError(f"Unsupported resource type: {self.resource_type}")
+            span.set(chars=len(data))
+            return data
 
     def load_text(self):
         with open(self.resource_path, 'r') as file:
             return file.read()
 
+    def iter_lines(self):
+        # text files are streamed from disk unless they are already loaded
+        if self.resource_type == 'text' and self._data is None:
+            with open(self.resource_path, 'r') as file:
+                yield from file
+        else:
+            yield from self.data.splitlines(keepends=True)
+
     def load_pdf(self):
+        # Page texts are cached on disk under the file's content hash. Pages not in
+        # the cache are extracted in parallel, each worker opening its own reader.
+        page_dir = os.path.join(self.cache_dir, self.get_file_hash())
+        import PyPDF2
         with open(self.resource_path, 'rb') as file:
+            page_count = len(PyPDF2.PdfReader(file).pages)
+
+        pages = [None] * page_count
+        for index in range(page_count):
+            page_file = os.path.join(page_dir, f"{index}.txt")
+            if os.path.exists(page_file):
+                with open(page_file, 'r', encoding='utf-8') as f:
+                    pages[index] = f.read()
+
+        missing = [index for index, page in enumerate(pages) if page is None]
+        if missing:
+            workers = min(self.pdf_workers, len(missing) // 8 or 1)
+            batches = [missing[i::workers] for i in range(workers)]
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    extracted = list(executor.map(Resources.extract_pdf_pages, [self.resource_path] * workers, batches))
+            else:
+                extracted = [Resources.extract_pdf_pages(self.resource_path, missing)]
+
+            os.makedirs(page_dir, exist_ok=True)
+            for batch, texts in zip(batches, extracted):
+                for index, text in zip(batch, texts):
+                    pages[index] = text
+                    tmp_file = os.path.join(page_dir, f"{index}.{os.getpid()}.tmp")
+                    with open(tmp_file, 'w', encoding='utf-8') as f:
+                        f.write(text)
+                    os.replace(tmp_file, os.path.join(page_dir, f"{index}.txt"))
+
+        return "".join(f"{page}\n" for page in pages)
+
+    @staticmethod
+    def extract_pdf_pages(path: str, indexes: List[int]) -> List[str]:
+        import PyPDF2
+        with open(path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            return [pdf_reader.pages[index].extract_text() for index in indexes]
+
+    def get_file_hash(self) -> str:
+        digest = hashlib.sha256()
+        with open(self.resource_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get_content_hash(self) -> str:
+        # files are hashed from disk without loading them; web pages from their text
+        if self.resource_type in ('text', 'pdf'):
+            return self.get_file_hash()
+        return hashlib.sha256(self.data.encode()).hexdigest()
 
     def load_web(self):
-        response = requests.get(self.resource_path)
-        return response.text
+        html = HttpCache.shared().fetch(self.resource_path, max_bytes=self.max_bytes)
+        if self.raw_html:
+            return html
+        # chunk the readable text, not the markup and scripts around it
+        return TextCleaner.extract_main_text(html)
 
     def chunk_resource(self, chunk_size: int, overlap: int = 0):
-        chunker = TextChunker(self.data, chunk_size, overlap)
-        self.chunks = chunker.chunk_text()
+        self.chunks = list(self.iter_chunks(chunk_size, overlap))
+
+    def iter_chunks(self, chunk_size: int, overlap: int = 0):
+        return TextChunker(self.data, chunk_size, overlap).iter_chunks()
 
     def contextualize_chunk(self, chunk: Dict[str, Any]) -> str:
         if self.context_template:
@@ -72,40 +298,78 @@ class Resources:
 # TOOLS
 
 class TextChunker:
-    def __init__(self, text: str = None, chunk_size: int = 1000, overlap: int = 0):
+    # Token arrays are shared by every chunker. They are cached per content hash
+    # as compact uint32 arrays (least recently used dropped past
+    # token_cache_limit), so re-chunking a resource skips tiktoken entirely.
+    token_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+    token_cache_limit = 50_000_000
+    token_cache_size = 0
+    cache_lock = threading.Lock()
+
+    def __init__(self, text: str = None, chunk_size: int = 1000, overlap: int = 0, encoding_name: str = "cl100k_base"):
         self.text = text
         self.chunk_size = chunk_size
         self.overlap = overlap
-        self.encoding = get_encoding("cl100k_base")
-
-    def chunk_text(self, text: str = None, chunk_size: int = None, start_pos: int = 0) -> List[Dict[str, Any]]:
+        self.encoding_name = encoding_name
+
+    @property
+    def encoding(self):
+        return ModelRegistry.encoding(self.encoding_name)
+
+    def encode(self, text: str) -> np.ndarray:
+        key = f"{self.encoding.name}:{hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()}"
+        cls = TextChunker
+        with cls.cache_lock:
+            tokens = cls.token_cache.get(key)
+            if tokens is not None:
+                cls.token_cache.move_to_end(key)
+                return tokens
+
+        tokens = np.asarray(self.encoding.encode(text), dtype=np.uint32)
+
+        with cls.cache_lock:
+            if key not in cls.token_cache:
+                cls.token_cache[key] = tokens
+                cls.token_cache_size += len(tokens)
+            while cls.token_cache_size > cls.token_cache_limit and len(cls.token_cache) > 1:
+                _, evicted = cls.token_cache.popitem(last=False)
+                cls.token_cache_size -= len(evicted)
+        return tokens
+
+    def chunk_text(self, text: str = None, chunk_size: int = None, start_pos: int = 0, num_chunks: Optional[int] = None) -> List[Dict[str, Any]]:
+        with Tracer.span("chunk_text", chunk_size=chunk_size or self.chunk_size) as span:
+            chunks = list(islice(self.iter_chunks(text, chunk_size, start_pos), num_chunks))
+            span.set(chunks=len(chunks))
+            return chunks
+
+    def iter_chunks(self, text: str = None, chunk_size: int = None, start_pos: int = 0):
         if text is not None:
             self.text = text
         if chunk_size is not None:
             self.chunk_size = chunk_size
+        with Tracer.span("tokenize", chars=len(self.text)) as span:
+            tokens = self.encode(self.text)
+            span.set(tokens=len(tokens))
+        return self.generate_chunks(tokens, self.chunk_size, self.overlap, start_pos)
 
-        tokens = self.encoding.encode(self.text)
+    def generate_chunks(self, tokens: np.ndarray, chunk_size: int, overlap: int, start_pos: int):
+        # chunks are decoded only as they are consumed
         num_tokens = len(tokens)
-
-        chunks = []
         current_pos = start_pos
 
         while current_pos < num_tokens:
-            chunk_start = max(0, current_pos - self.overlap)
-            chunk_end = min(current_pos + self.chunk_size, num_tokens)
+            chunk_start = max(0, current_pos - overlap)
+            chunk_end = min(current_pos + chunk_size, num_tokens)
 
-            chunk_tokens = tokens[chunk_start:chunk_end]
-            chunk_text = self.encoding.decode(chunk_tokens)
+            chunk_text = self.encoding.decode(tokens[chunk_start:chunk_end].tolist())
 
-            chunks.append({
+            yield {
                 "text": chunk_text,
                 "start": chunk_start,
                 "end": chunk_end
-            })
-
-            current_pos += self.chunk_size - self.overlap
+            }
 
-        return chunks
+            current_pos += chunk_size - overlap
 
 class TextCleaner:
     def __init__(self, text: str):
@@ -125,6 +389,25 @@ class TextCleaner:
             writer.writerow(columns)
         return output.getvalue()
 
+    @staticmethod
+    def extract_main_text(html: str) -> str:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, TextCleaner.html_parser())
+        for tag in soup(['script', 'style', 'noscript', 'template', 'svg', 'iframe', 'form', 'nav', 'header', 'footer', 'aside']):
+            tag.decompose()
+        main = (soup.find('main') or soup.find('article') or soup.find(attrs={'role': 'main'})
+                or soup.find('div', class_='mw-parser-output') or soup.body or soup)
+        lines = (line.strip() for line in main.get_text(separator='\n').splitlines())
+        return '\n'.join(line for line in lines if line)
+
+    @staticmethod
+    def html_parser() -> str:
+        try:
+            import lxml  # noqa: F401
+            return 'lxml'
+        except ImportError:
+            return 'html.parser'
+
     def remove_special_characters(self, text: str) -> str:
         return re.sub(r'[^\w\s,]', '', text)
 
@@ -139,7 +422,6 @@ class TextReaderTool:
         self.num_chunks = num_chunks
 
     def read_text(self) -> List[Dict[str, Any]]:
-        self.resource.chunk_resource(self.chunk_size)
         contextualized_chunks = [
             {
                 'text': self.resource.contextualize_chunk(chunk),
@@ -147,7 +429,7 @@ class TextReaderTool:
                 'end': chunk['end'],
                 'file': self.resource.resource_path
             }
-            for chunk in self.resource.chunks[:self.num_chunks]
+            for chunk in islice(self.resource.iter_chunks(self.chunk_size), self.num_chunks)
         ]
         return contextualized_chunks
 
@@ -158,7 +440,6 @@ class WebScraperTool:
         self.num_chunks = num_chunks
 
     def scrape_text(self) -> List[Dict[str, Any]]:
-        self.resource.chunk_resource(self.chunk_size)
         contextualized_chunks = [
             {
                 'text': self.resource.contextualize_chunk(chunk),
@@ -166,45 +447,334 @@ class WebScraperTool:
                 'end': chunk['end'],
                 'file': self.resource.resource_path
             }
-            for chunk in self.resource.chunks[:self.num_chunks]
+            for chunk in islice(self.resource.iter_chunks(self.chunk_size), self.num_chunks)
         ]
         return contextualized_chunks
 
 class NERExtractionTool:
-    def __init__(self, text: str = None):
+    # Components the entity recognizer does not read from; they are left out of the
+    # loaded pipeline. Entities are cached per text hash across all instances.
+    unused_components = ("tagger", "parser", "senter", "attribute_ruler", "lemmatizer", "morphologizer")
+    entity_cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    cache_size = 10000
+    cache_lock = threading.Lock()
+
+    def __init__(self, text: str = None, model: str = "en_core_web_sm", batch_size: int = 64, n_process: int = 1):
         self.text = text
-        self.nlp = spacy.load("en_core_web_sm")
+        self.model = model
+        self.batch_size = batch_size
+        self.n_process = n_process
+
+    @property
+    def nlp(self):
+        return ModelRegistry.get(("spacy-ner", self.model), self.load_pipeline)
+
+    def load_pipeline(self):
+        import spacy
+        nlp = spacy.load(self.model, disable=list(self.unused_components))
+        if "tok2vec" in nlp.pipe_names and "ner" not in nlp.get_pipe("tok2vec").listening_components:
+            # the shared tok2vec only feeds the disabled components
+            nlp.disable_pipe("tok2vec")
+        return nlp
 
     def extract_entities(self, text: Optional[str] = None) -> List[Dict[str, Any]]:
         if text is not None:
             self.text = text
-        doc = self.nlp(self.text)
+        return self.extract_entities_batch([self.text])[0]
+
+    def extract_entities_batch(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
+        keys = [f"{self.model}:{hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()}" for text in texts]
+        results = {}
+        with self.cache_lock:
+            for key in keys:
+                if key in self.entity_cache:
+                    self.entity_cache.move_to_end(key)
+                    results[key] = self.entity_cache[key]
+
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in results and key not in pending:
+                pending[key] = text
+
+        if pending:
+            docs = self.nlp.pipe(pending.values(), batch_size=self.batch_size, n_process=self.n_process)
+            for key, doc in zip(pending, docs):
+                results[key] = [
+                    {
+                        "text": ent.text,
+                        "start": ent.start_char,
+                        "end": ent.end_char,
+                        "label": ent.label_
+                    }
+                    for ent in doc.ents
+                ]
+            with self.cache_lock:
+                for key in pending:
+                    self.entity_cache[key] = results[key]
+                while len(self.entity_cache) > self.cache_size:
+                    self.entity_cache.popitem(last=False)
+
+        return [results[key] for key in keys]
+
+    def extract_corpus_entities(self, resources: List['Resources'], chunk_size: int = 1000, window: int = 10000) -> List[Dict[str, Any]]:
+        # Chunks are fed through nlp.pipe a window at a time to bound memory.
         entities = []
+        window_chunks = []
 
-        for ent in doc.ents:
-            entities.append({
-                "text": ent.text,
-                "start": ent.start_char,
-                "end": ent.end_char,
-                "label": ent.label_
-            })
+        def flush():
+            batch = self.extract_entities_batch([chunk['text'] for _, chunk in window_chunks])
+            for (resource, chunk), chunk_entities in zip(window_chunks, batch):
+                for ent in chunk_entities:
+                    entities.append(dict(ent, file=resource.resource_path, chunk_start=chunk['start'], chunk_end=chunk['end']))
+            window_chunks.clear()
 
+        for resource in resources:
+            for chunk in resource.iter_chunks(chunk_size):
+                window_chunks.append((resource, chunk))
+                if len(window_chunks) >= window:
+                    flush()
+        if window_chunks:
+            flush()
         return entities
 
 class SemanticAnalysisTool:
+    # Batch scoring uses TextBlob's pattern lexicon compiled into numpy lookup
+    # arrays. Text is split the way pattern's tokenizer splits prose ("isn't" is
+    # "is n ' t"), and its modifier ("very good"), negation ("not good") and "!"
+    # rules are replayed as array masks, then averaged per text with bincount.
+    # Scores are cached per text hash.
+    paragraph_break = re.compile(r"\n{2,}")
+    sentence_ends = {"...", ".", "!", "?", "\0"}
+    sentence_closers = {"\u201d", "\u2019", "...", ".", "!", "?", ")", "\0"}
+    sentiment_cache: "OrderedDict[str, tuple]" = OrderedDict()
+    cache_size = 10000
+    cache_lock = threading.Lock()
+
     def __init__(self, text: str = None):
         self.text = text
 
     def analyze_sentiment(self, text: Optional[str] = None) -> Dict[str, Any]:
         if text is not None:
             self.text = text
-        blob = TextBlob(self.text)
-        sentiment = blob.sentiment
+        key = f"textblob:{hashlib.sha1(self.text.encode('utf-8', 'surrogatepass')).hexdigest()}"
+        with self.cache_lock:
+            cached = self.sentiment_cache.get(key)
+        if cached is None:
+            from textblob import TextBlob
+            sentiment = TextBlob(self.text).sentiment
+            cached = (sentiment.polarity, sentiment.subjectivity)
+            self.cache_scores({key: cached})
         return {
-            "polarity": sentiment.polarity,
-            "subjectivity": sentiment.subjectivity
+            "polarity": cached[0],
+            "subjectivity": cached[1]
         }
 
+    def analyze_sentiment_batch(self, texts: List[str]) -> Dict[str, Any]:
+        keys = [f"lexicon:{hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()}" for text in texts]
+        scores = {}
+        with self.cache_lock:
+            for key in keys:
+                if key in self.sentiment_cache:
+                    self.sentiment_cache.move_to_end(key)
+                    scores[key] = self.sentiment_cache[key]
+
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in scores and key not in pending:
+                pending[key] = text
+        if pending:
+            polarity, subjectivity = self.score_texts(list(pending.values()))
+            computed = {key: (float(p), float(s)) for key, p, s in zip(pending, polarity, subjectivity)}
+            scores.update(computed)
+            self.cache_scores(computed)
+
+        polarity = np.asarray([scores[key][0] for key in keys], dtype=np.float64)
+        subjectivity = np.asarray([scores[key][1] for key in keys], dtype=np.float64)
+        return {
+            "scores": [{"polarity": scores[key][0], "subjectivity": scores[key][1]} for key in keys],
+            "aggregate": {
+                "count": len(keys),
+                "polarity_mean": float(polarity.mean()) if len(keys) else 0.0,
+                "polarity_std": float(polarity.std()) if len(keys) else 0.0,
+                "subjectivity_mean": float(subjectivity.mean()) if len(keys) else 0.0,
+                "positive_share": float((polarity > 0.05).mean()) if len(keys) else 0.0,
+                "negative_share": float((polarity < -0.05).mean()) if len(keys) else 0.0
+            }
+        }
+
+    def analyze_resources(self, resources: List['Resources'], chunk_size: int = 1000) -> Dict[str, Any]:
+        chunks = [(resource, chunk) for resource in resources for chunk in resource.iter_chunks(chunk_size)]
+        result = self.analyze_sentiment_batch([chunk['text'] for _, chunk in chunks])
+        for score, (resource, chunk) in zip(result["scores"], chunks):
+            score.update(file=resource.resource_path, start=chunk['start'], end=chunk['end'])
+        return result
+
+    def cache_scores(self, scores: Dict[str, tuple]):
+        with self.cache_lock:
+            self.sentiment_cache.update(scores)
+            while len(self.sentiment_cache) > self.cache_size:
+                self.sentiment_cache.popitem(last=False)
+
+    @classmethod
+    def split_tokens(cls, text: str, table: Dict[str, Any]) -> List[str]:
+        # paragraph breaks become a "\0" token that ends a sentence
+        text = cls.paragraph_break.sub(" \0 ", text.replace("\r\n", "\n").replace("n't", " n't"))
+        tokens = table["token_pattern"].findall(text)
+        joined = " ".join(token for token in tokens if token != "\0")
+        if not table["emoticon_pattern"].search(joined) and not table["sarcasm_pattern"].search(joined):
+            return joined.lower().split()
+        # Sentences end the way pattern ends them (a full stop plus any closing
+        # brackets or quotes), since emoticons are only rejoined within one.
+        words, start, i = [], 0, 0
+        while i < len(tokens):
+            if tokens[i] in cls.sentence_ends:
+                while i < len(tokens) and tokens[i] in cls.sentence_closers:
+                    i += 1
+                words.extend(cls.join_sentence(tokens[start:i], table))
+                start = i
+            i += 1
+        words.extend(cls.join_sentence(tokens[start:], table))
+        return words
+
+    @staticmethod
+    def join_sentence(tokens: List[str], table: Dict[str, Any]) -> List[str]:
+        # pattern rejoins split emoticons (": )" is ":)") and marks sarcasm as "(!)"
+        sentence = table["sarcasm_pattern"].sub("(!)", " ".join(token for token in tokens if token != "\0"))
+        sentence = table["emoticon_pattern"].sub(lambda m: m.group(1).replace(" ", "") + m.group(2), sentence)
+        return sentence.lower().split()
+
+    @staticmethod
+    def compile_token_pattern(pattern: Any) -> re.Pattern:
+        # Mirrors pattern's find_tokens on prose: quotes always split, leading and
+        # trailing punctuation split off one character at a time ("..." as one), and
+        # a trailing full stop stays on known abbreviations ("Mr.", "e.g.").
+        quotes = "'\"\u2018\u2019\u201c\u201d"
+        punctuation = re.escape("".join(c for c in pattern.PUNCTUATION if c not in quotes + "."))
+        abbreviations = "|".join(re.escape(a) for a in sorted(pattern.ABBREVIATIONS, key=len, reverse=True) if a.endswith("."))
+        return re.compile(
+            rf"(?<![^\s{quotes}{punctuation}])(?:{abbreviations}|(?:[A-Za-z]\.)+|[A-Z][bcdfghjklmnpqrstvwxz|]+\.)(?=[{punctuation}]*(?:[\s{quotes}]|$))"
+            rf"|[^\s{quotes}{punctuation}][^\s{quotes}]*[^\s{quotes}{punctuation}.]"
+            rf"|[^\s{quotes}{punctuation}.]"
+            r"|\.\.\.|\S"
+        )
+
+    @classmethod
+    def compile_lexicon(cls) -> Dict[str, Any]:
+        from textblob import _text as pattern
+        from textblob.en import sentiment as lexicon
+        lexicon.load()
+        emoticons = {"(!)": 0.0}
+        for (_, polarity), faces in pattern.EMOTICONS.items():
+            for face in faces:
+                face = face.lower()
+                if not face.isalpha() and len(face) <= 5 and face not in pattern.PUNCTUATION:
+                    emoticons.setdefault(face, polarity)
+        words = sorted(set(lexicon.keys()) | set(lexicon.negations) | set(emoticons) | {"!"})
+        # id 0 is reserved for tokens outside the lexicon
+        vocab = {word: index + 1 for index, word in enumerate(words)}
+        size = len(words) + 1
+        table = {
+            "vocab": vocab,
+            "token_pattern": cls.compile_token_pattern(pattern),
+            "emoticon_pattern": pattern.RE_EMOTICONS,
+            "sarcasm_pattern": pattern.RE_SARCASM,
+            "polarity": np.zeros(size),
+            "subjectivity": np.zeros(size),
+            "intensity": np.ones(size),
+            "known": np.zeros(size, dtype=bool),
+            "modifier": np.zeros(size, dtype=bool),
+            "ly_modifier": np.zeros(size, dtype=bool),
+            "negation": np.zeros(size, dtype=bool),
+            "emoticon": np.zeros(size, dtype=bool)
+        }
+        for word, index in vocab.items():
+            senses = lexicon.get(word)
+            if senses and None in senses:
+                table["polarity"][index], table["subjectivity"][index], table["intensity"][index] = senses[None][:3]
+                table["known"][index] = True
+                table["modifier"][index] = any(pos in lexicon.modifiers for pos in senses)
+                table["ly_modifier"][index] = table["modifier"][index] and lexicon.modifier(word)
+            table["negation"][index] = word in lexicon.negations
+            if word in emoticons and not table["known"][index]:
+                table["polarity"][index], table["subjectivity"][index] = emoticons[word], 1.0
+                table["emoticon"][index] = True
+        return table
+
+    def score_texts(self, texts: List[str]) -> tuple:
+        table = ModelRegistry.get(("sentiment-lexicon",), self.compile_lexicon)
+        vocab = table["vocab"]
+        ids, owners, lengths = [], [], []
+        for owner, text in enumerate(texts):
+            tokens = self.split_tokens(text, table)
+            ids.extend(vocab.get(token, 0) for token in tokens)
+            lengths.extend(map(len, tokens))
+            owners.extend([owner] * len(tokens))
+        ids = np.asarray(ids, dtype=np.int64)
+        owners = np.asarray(owners, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        positions = np.arange(len(ids))
+
+        def latest(mask: np.ndarray, strict: bool = False) -> np.ndarray:
+            # position of the latest True at (or strictly before) each token of the same text, else -1
+            found = np.maximum.accumulate(np.where(mask, positions, -1)) if len(ids) else positions
+            if strict:
+                found = np.concatenate(([-1], found[:-1]))[:len(ids)]
+            return np.where((found >= 0) & (owners[np.maximum(found, 0)] == owners), found, -1)
+
+        known = table["known"][ids]
+        unknown = ~known
+        negation = table["negation"][ids]
+        # emoticons are scored on their own and, like known words, can take a fold or a "!"
+        emoticon = table["emoticon"][ids]
+        scored = known | emoticon
+        prev_scored = latest(scored, strict=True)
+
+        # pattern keeps a pending modifier m and negation n while it walks the tokens;
+        # both are recovered here from the positions where they were last set or cleared
+        prev_known = latest(known, strict=True)
+        prev_ids = ids[np.maximum(prev_known, 0)]
+        after_modifier = (prev_known >= 0) & table["modifier"][prev_ids]
+        # "really not good": a negation right after an -ly modifier negates that modifier's chunk
+        ly_negation = unknown & negation & (prev_known >= 0) & table["ly_modifier"][prev_ids]
+        modifier_reset = unknown & (lengths > 2) & ~ly_negation
+        modified = after_modifier & (latest(modifier_reset) < prev_known)
+        negates_modifier = ly_negation & modified
+        folded = known & modified
+
+        # "not (a) good": a negation carries over one-letter tokens up to the next known word
+        last_negation = latest(negation)
+        negation_reset = unknown & ~negation & (lengths > 1)
+        negated = known & (last_negation > prev_known) & ~negates_modifier[np.maximum(last_negation, 0)] & (latest(negation_reset) < last_negation)
+
+        # "very good": a known word after a modifier folds into the latest chunk and
+        # is scaled by its last word's intensity, inverted if that word was negated
+        intensity = np.where(negated, 1.0 / table["intensity"][ids], table["intensity"][ids])
+        scale = np.where(folded, intensity[np.maximum(prev_scored, 0)], 1.0)
+        polarity = np.where(folded, np.clip(table["polarity"][ids] * scale, -1.0, 1.0), table["polarity"][ids])
+        subjectivity = np.where(folded, np.clip(table["subjectivity"][ids] * scale, -1.0, 1.0), table["subjectivity"][ids])
+
+        # one score per chunk, taken at its last word
+        chunk = np.cumsum((known & ~modified) | emoticon) - 1
+        final = scored.copy()
+        final[prev_scored[folded]] = False
+        chunk_negated = np.zeros(int(final.sum()), dtype=bool)
+        chunk_negated[chunk[negated]] = True
+        chunk_negated[chunk[negates_modifier]] = True
+        # each "!" boosts the latest chunk, unless a later word folds into it and overwrites the score
+        boosted = latest(scored)[ids == vocab["!"]]
+        boosted = boosted[boosted >= 0]
+        boosts = np.bincount(chunk[boosted[final[boosted]]], minlength=len(chunk_negated))
+
+        chunk_owners = owners[final]
+        chunk_polarity = np.clip(polarity[final] * 1.25 ** boosts, -1.0, 1.0)
+        chunk_polarity = np.where(chunk_negated, chunk_polarity * -0.5, chunk_polarity)
+
+        counts = np.bincount(chunk_owners, minlength=len(texts))
+        divisor = np.maximum(counts, 1)
+        mean_polarity = np.bincount(chunk_owners, weights=chunk_polarity, minlength=len(texts)) / divisor
+        mean_subjectivity = np.bincount(chunk_owners, weights=subjectivity[final], minlength=len(texts)) / divisor
+        return mean_polarity, mean_subjectivity
+
 class UserFeedbackTool:
     def __init__(self, prompt: str):
         self.prompt = prompt
@@ -218,178 +788,1347 @@ class UserFeedbackTool:
             print(f"\nUser Feedback: {feedback}\n")
         return feedback
 
+class HttpCache:
+    # Pooled session plus an on-disk response cache. Entries younger than fresh_for
+    # are served without touching the network; older ones are revalidated with
+    # If-None-Match / If-Modified-Since so unchanged pages only cost a 304.
+    _shared: Dict[str, "HttpCache"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, cache_dir: str = ".http_cache", fresh_for: float = 3600, timeout: float = 30, pool_size: int = 16):
+        from requests.adapters import HTTPAdapter
+        self.cache_dir = cache_dir
+        self.fresh_for = fresh_for
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def shared(cls, cache_dir: str = ".http_cache") -> "HttpCache":
+        with cls._lock:
+            if cache_dir not in cls._shared:
+                cls._shared[cache_dir] = cls(cache_dir)
+            return cls._shared[cache_dir]
+
+    def path_for(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode()).hexdigest())
+
+    def load_entry(self, url: str) -> Optional[Dict[str, Any]]:
+        path = self.path_for(url)
+        try:
+            with open(f"{path}.json", 'r') as f:
+                entry = json.load(f)
+            with open(f"{path}.body", 'r', encoding='utf-8') as f:
+                entry["text"] = f.read()
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def store_entry(self, url: str, headers: Dict[str, str], text: str):
+        path = self.path_for(url)
+        tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(f"{path}.body{tmp_suffix}", 'w', encoding='utf-8') as f:
+            f.write(text)
+        with open(f"{path}.json{tmp_suffix}", 'w') as f:
+            json.dump({
+                "url": url,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "fetched": time.time()
+            }, f)
+        os.replace(f"{path}.body{tmp_suffix}", f"{path}.body")
+        os.replace(f"{path}.json{tmp_suffix}", f"{path}.json")
+
+    def fetch(self, url: str, max_bytes: Optional[int] = None) -> str:
+        entry = self.load_entry(url)
+        if entry and time.time() - entry["fetched"] < self.fresh_for:
+            return entry["text"]
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and entry:
+                self.store_entry(url, {"ETag": entry.get("etag"), "Last-Modified": entry.get("last_modified")}, entry["text"])
+                return entry["text"]
+            text = self.read_body(response, max_bytes)
+
+        if response.status_code == 200:
+            self.store_entry(url, response.headers, text)
+        return text
+
+    def read_body(self, response: requests.Response, max_bytes: Optional[int] = None) -> str:
+        # streamed in blocks and cut off at max_bytes, so huge pages never land in memory whole
+        blocks, size = [], 0
+        for block in response.iter_content(chunk_size=64 * 1024):
+            blocks.append(block)
+            size += len(block)
+            if max_bytes is not None and size >= max_bytes:
+                break
+        body = b"".join(blocks)
+        if max_bytes is not None:
+            body = body[:max_bytes]
+        # requests falls back to latin-1 for text/* without a charset; most pages are utf-8
+        has_charset = 'charset' in response.headers.get('Content-Type', '').lower()
+        return body.decode(response.encoding if has_charset and response.encoding else 'utf-8', errors='replace')
+
 class WikipediaSearchTool:
-    def __init__(self, chunk_size: int = 1000, num_chunks: int = 10):
+    def __init__(self, chunk_size: int = 1000, num_chunks: int = 10, base_url: str = "https://en.wikipedia.org", max_workers: int = 8, http_cache: Optional[HttpCache] = None):
         self.chunk_size = chunk_size
         self.num_chunks = num_chunks
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.http = http_cache or HttpCache.shared()
         self.chunker = TextChunker()
 
     def search_wikipedia(self, query: str, top_k: int = 3) -> List[Dict[str, str]]:
-        url = f"https://en.wikipedia.org/w/index.php?search={query}&title=Special:Search&fulltext=1"
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        url = f"{self.base_url}/w/index.php?" + urlencode({"search": query, "title": "Special:Search", "fulltext": 1})
+        links = self.parse_search_results(self.http.fetch(url))[:top_k]
+        if not links:
+            return []
+
+        # result pages are fetched concurrently over the pooled session
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(links))) as executor:
+            pages = list(executor.map(self.http.fetch, [page_url for _, page_url in links]))
 
         search_results = []
-        for result in soup.find_all('li', class_='mw-search-result'):
-            title = result.find('a').get_text()
-            url = 'https://en.wikipedia.org' + result.find('a')['href']
-            page_response = requests.get(url)
-            page_soup = BeautifulSoup(page_response.text, 'html.parser')
-            content = page_soup.find('div', class_='mw-parser-output').get_text()
+        for (title, page_url), page in zip(links, pages):
+            content = self.extract_content(page)
             chunks = self.chunker.chunk_text(text=content, chunk_size=self.chunk_size, num_chunks=self.num_chunks)
-            search_results.append({'title': title, 'url': url, 'chunks': chunks})
-            if len(search_results) >= top_k:
-                break
+            search_results.append({'title': title, 'url': page_url, 'chunks': chunks})
 
         return search_results
 
+    def parse_search_results(self, html: str) -> List[tuple]:
+        from bs4 import BeautifulSoup, SoupStrainer
+        soup = BeautifulSoup(html, TextCleaner.html_parser(), parse_only=SoupStrainer('li', class_='mw-search-result'))
+        links = []
+        for result in soup.find_all('li', class_='mw-search-result'):
+            link = result.find('a')
+            if link is not None and link.get('href'):
+                links.append((link.get_text(), urljoin(self.base_url + '/', link['href'])))
+        return links
+
+    def extract_content(self, html: str) -> str:
+        # only the article body is built into a tree
+        from bs4 import BeautifulSoup, SoupStrainer
+        soup = BeautifulSoup(html, TextCleaner.html_parser(), parse_only=SoupStrainer('div', class_='mw-parser-output'))
+        content = soup.find('div', class_='mw-parser-output')
+        return content.get_text() if content is not None else ""
+
+class EmbeddingStore:
+    # On-disk index directory. Every write goes to a new version directory and the
+    # `current` file names the live one, so a rewrite never replaces files a reader
+    # still has mapped. In a version, vectors.npy holds the L2-normalised float32
+    # matrix, chunks.npy one int64 row per chunk (file id, start, end, text offsets),
+    # keys.npy the content hash each vector was embedded from, texts.bin the utf-8
+    # chunk texts and meta.json the file list. Everything is memory-mapped
+    # read-only, so opening is cheap and processes share pages.
+    def __init__(self, path: str):
+        self.root = path
+        self.version = self.current_version(path)
+        self.path = os.path.join(path, self.version)
+        with open(os.path.join(self.path, "meta.json"), 'r') as f:
+            meta = json.load(f)
+        self.files = meta["files"]
+        self.dim = meta["dim"]
+        self.digest = meta.get("digest")
+        self.manifest = meta.get("manifest", {})
+        self.vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode='r')
+        self.chunks = np.load(os.path.join(self.path, "chunks.npy"), mmap_mode='r')
+        self.keys = np.load(os.path.join(self.path, "keys.npy"), mmap_mode='r')
+        self.texts = self.map_texts(os.path.join(self.path, "texts.bin"))
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, "current"))
+
+    @staticmethod
+    def current_version(path: str) -> Optional[str]:
+        try:
+            with open(os.path.join(path, "current"), 'r') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def map_texts(path: str):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def key_index(self) -> Dict[str, int]:
+        return {key.decode(): row for row, key in enumerate(self.keys)}
+
+    def file_rows(self, file: str) -> np.ndarray:
+        if file not in self.files:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.chunks[:, 0] == self.files.index(file))
+
+    def close(self):
+        # drops this process's maps so a superseded version can be deleted on Windows
+        if isinstance(self.texts, mmap.mmap):
+            self.texts.close()
+        self.vectors = self.chunks = self.keys = self.texts = None
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        file_id, start, end, text_start, text_end = self.chunks[index]
+        return {
+            'file': self.files[file_id],
+            'text': self.texts[text_start:text_end].decode('utf-8'),
+            'start': int(start),
+            'end': int(end)
+        }
+
+    @classmethod
+    def write(cls, path: str, chunks: List[Dict[str, Any]], vectors: np.ndarray, keys: List[str], digest: Optional[str] = None, manifest: Optional[Dict[str, str]] = None) -> "EmbeddingStore":
+        previous = cls.current_version(path)
+        version = uuid.uuid4().hex
+        tmp_path = os.path.join(path, f"{version}.tmp")
+        os.makedirs(tmp_path)
+
+        files, file_ids, rows, offset = [], {}, [], 0
+        with open(os.path.join(tmp_path, "texts.bin"), 'wb') as f:
+            for chunk in chunks:
+                if chunk['file'] not in file_ids:
+                    file_ids[chunk['file']] = len(files)
+                    files.append(chunk['file'])
+                data = chunk['text'].encode('utf-8')
+                f.write(data)
+                rows.append((file_ids[chunk['file']], chunk['start'], chunk['end'], offset, offset + len(data)))
+                offset += len(data)
+
+        vectors = np.ascontiguousarray(SemanticFileSearchTool.normalize(np.asarray(vectors, dtype=np.float32)))
+        np.save(os.path.join(tmp_path, "vectors.npy"), vectors)
+        np.save(os.path.join(tmp_path, "chunks.npy"), np.asarray(rows, dtype=np.int64).reshape(-1, 5))
+        np.save(os.path.join(tmp_path, "keys.npy"), np.asarray(keys, dtype='S64'))
+        with open(os.path.join(tmp_path, "meta.json"), 'w') as f:
+            json.dump({"files": files, "dim": int(vectors.shape[1]), "count": len(rows), "digest": digest, "manifest": manifest or {}}, f)
+
+        # Only the small pointer file is replaced, never a directory with mapped files.
+        os.replace(tmp_path, os.path.join(path, version))
+        pointer_path = os.path.join(path, f"current.{version}.tmp")
+        with open(pointer_path, 'w') as f:
+            f.write(version)
+        os.replace(pointer_path, os.path.join(path, "current"))
+
+        # The version just replaced stays for readers that resolved the old pointer;
+        # older ones go. Files still mapped somewhere (Windows) are retried next write.
+        for name in os.listdir(path):
+            if name in ("current", version, previous) or name.endswith(".tmp"):
+                continue
+            entry = os.path.join(path, name)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                # files left by the old single-directory layout
+                try:
+                    os.remove(entry)
+                except OSError:
+                    pass
+        return cls(path)
+
+class IVFIndex:
+    # Inverted-file ANN index: spherical k-means centroids over the normalised
+    # vectors, with row ids grouped by nearest centroid. A query only scores the
+    # rows in its nprobe closest lists. Saved next to the EmbeddingStore files.
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, digest: Optional[str] = None):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.digest = digest
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: int, iterations: int = 20, sample_size: int = 256, seed: int = 0, digest: Optional[str] = None) -> "IVFIndex":
+        rng = np.random.default_rng(seed)
+        n = len(vectors)
+        n_lists = max(1, min(n_lists, n))
+        sample = np.asarray(vectors[np.sort(rng.choice(n, size=min(n, n_lists * sample_size), replace=False))])
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assign, minlength=n_lists)
+            filled = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+            sums = np.add.reduceat(sample[np.argsort(assign, kind='stable')], starts, axis=0)
+            centroids[filled] = SemanticFileSearchTool.normalize(sums)
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, 65536):
+            assign[start:start + 65536] = np.argmax(np.asarray(vectors[start:start + 65536]) @ centroids.T, axis=1)
+        order = np.argsort(assign, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=n_lists)))).astype(np.int64)
+        return cls(centroids.astype(np.float32), order, offsets, digest)
+
+    def search(self, vectors: np.ndarray, query_matrix: np.ndarray, k: int, nprobe: int) -> List[tuple]:
+        nprobe = min(nprobe, self.n_lists)
+        probes = np.argpartition(-(query_matrix @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        results = []
+        for query, lists in zip(query_matrix, probes):
+            candidates = np.sort(np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists]))
+            if not len(candidates):
+                results.append((candidates, np.zeros(0, dtype=np.float32)))
+                continue
+            scores = vectors[candidates] @ query
+            kk = min(k, len(candidates))
+            top = np.argpartition(-scores, kk - 1)[:kk]
+            top = top[np.argsort(-scores[top])]
+            results.append((candidates[top], scores[top]))
+        return results
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, "ivf.json"))
+
+    def save(self, path: str):
+        for name, array in (("ivf_centroids", self.centroids), ("ivf_order", self.order), ("ivf_offsets", self.offsets)):
+            tmp_file = os.path.join(path, f"{name}.{os.getpid()}.tmp.npy")
+            np.save(tmp_file, array)
+            os.replace(tmp_file, os.path.join(path, f"{name}.npy"))
+        tmp_file = os.path.join(path, f"ivf.{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump({"n_lists": self.n_lists, "digest": self.digest}, f)
+        os.replace(tmp_file, os.path.join(path, "ivf.json"))
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with open(os.path.join(path, "ivf.json"), 'r') as f:
+            meta = json.load(f)
+        return cls(
+            np.load(os.path.join(path, "ivf_centroids.npy"), mmap_mode='r'),
+            np.load(os.path.join(path, "ivf_order.npy"), mmap_mode='r'),
+            np.load(os.path.join(path, "ivf_offsets.npy"), mmap_mode='r'),
+            meta.get("digest")
+        )
+
+class BM25Index:
+    # Inverted index over the chunk store with BM25 scoring. Terms are kept as a
+    # sorted array (looked up with searchsorted), postings as one uint32 doc id
+    # array plus uint16 term frequencies grouped by term, so every file can be
+    # memory-mapped next to the EmbeddingStore files.
+    token_pattern = re.compile(r"\w+")
+    max_term_length = 32
+
+    def __init__(self, terms: np.ndarray, offsets: np.ndarray, docs: np.ndarray, freqs: np.ndarray, lengths: np.ndarray, k1: float = 1.2, b: float = 0.75, digest: Optional[str] = None):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.freqs = freqs
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        self.digest = digest
+        self.avg_length = float(np.mean(lengths)) if len(lengths) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        return [token for token in cls.token_pattern.findall(text.lower()) if len(token) <= cls.max_term_length]
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = 1.2, b: float = 0.75, digest: Optional[str] = None) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        token_ids, lengths = [], []
+        for text in texts:
+            tokens = cls.tokenize(text)
+            token_ids.extend(vocab.setdefault(token, len(vocab)) for token in tokens)
+            lengths.append(len(tokens))
+
+        n = len(lengths)
+        terms = np.array(sorted(vocab), dtype=f"U{cls.max_term_length}")
+        # renumber terms in sorted order so postings line up with the terms array
+        rank = np.empty(len(vocab), dtype=np.int64)
+        rank[[vocab[term] for term in terms.tolist()]] = np.arange(len(vocab))
+        token_ids = rank[np.asarray(token_ids, dtype=np.int64)]
+        doc_ids = np.repeat(np.arange(n, dtype=np.int64), lengths)
+
+        # (term, doc) pairs sorted term-major; the count of each pair is its tf
+        pairs, freqs = np.unique(token_ids * max(n, 1) + doc_ids, return_counts=True)
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(pairs // max(n, 1), minlength=len(terms))))).astype(np.int64)
+        return cls(
+            terms,
+            offsets,
+            (pairs % max(n, 1)).astype(np.uint32),
+            np.minimum(freqs, np.iinfo(np.uint16).max).astype(np.uint16),
+            np.asarray(lengths, dtype=np.uint32),
+            k1, b, digest
+        )
+
+    def term_ids(self, query: str) -> np.ndarray:
+        tokens = np.unique(np.asarray(self.tokenize(query), dtype=self.terms.dtype))
+        if not len(tokens) or not len(self.terms):
+            return np.zeros(0, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.terms, tokens), len(self.terms) - 1)
+        return positions[self.terms[positions] == tokens]
+
+    def search(self, query: str, k: int) -> tuple:
+        # Only the postings of the query terms are touched; returns (doc ids, scores)
+        # of the best k docs that contain at least one of them.
+        n = len(self)
+        scores = np.zeros(n, dtype=np.float32)
+        touched = []
+        for term in self.term_ids(query):
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.docs[start:end]
+            tf = self.freqs[start:end].astype(np.float32)
+            df = end - start
+            idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.lengths[docs] / max(self.avg_length, 1e-9))
+            scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+            touched.append(docs)
+        if not touched:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        candidates = np.unique(np.concatenate(touched)).astype(np.int64)
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores[candidates], k - 1)[:k]
+        top = top[np.argsort(-scores[candidates[top]])]
+        return candidates[top], scores[candidates[top]]
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, "bm25.json"))
+
+    def save(self, path: str):
+        arrays = (("bm25_terms", self.terms), ("bm25_offsets", self.offsets), ("bm25_docs", self.docs), ("bm25_freqs", self.freqs), ("bm25_lengths", self.lengths))
+        for name, array in arrays:
+            tmp_file = os.path.join(path, f"{name}.{os.getpid()}.tmp.npy")
+            np.save(tmp_file, array)
+            os.replace(tmp_file, os.path.join(path, f"{name}.npy"))
+        tmp_file = os.path.join(path, f"bm25.{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump({"k1": self.k1, "b": self.b, "digest": self.digest}, f)
+        os.replace(tmp_file, os.path.join(path, "bm25.json"))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(os.path.join(path, "bm25.json"), 'r') as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in ("bm25_terms", "bm25_offsets", "bm25_docs", "bm25_freqs", "bm25_lengths")]
+        return cls(*arrays, k1=meta["k1"], b=meta["b"], digest=meta.get("digest"))
+
 class SemanticFileSearchTool:
-    def __init__(self, resources: List['Resources'], embed_model: str, embed_dim: int = 768, chunk_size: int = 1000, top_k: int = 3):
-        self.embedder = Embed4All(embed_model)
+    worker_embedder = None
+
+    def __init__(self, resources: List['Resources'], embed_model: str, embed_dim: int = 768, chunk_size: int = 1000, top_k: int = 3, index_name: Optional[str] = None, batch_size: int = 32, embed_workers: int = 1, verbose: bool = False, ann: bool = False, ann_lists: Optional[int] = None, nprobe: int = 8, hybrid: bool = False, bm25_candidates: int = 100, fusion_k: int = 60):
+        self.embed_model = embed_model
         self.embed_dim = embed_dim
         self.chunk_size = chunk_size
         self.top_k = top_k
+        self.batch_size = batch_size
+        self.embed_workers = embed_workers
+        self.verbose = verbose
+        self.ann_lists = ann_lists
+        self.nprobe = nprobe
+        self.bm25_candidates = bm25_candidates
+        self.fusion_k = fusion_k
         self.chunker = TextChunker(text=None, chunk_size=chunk_size)
-        self.file_embeddings = self.load_or_generate_file_embeddings(resources)
+        self.index_name = index_name or self.get_index_name(resources)
+        self.store = self.load_or_generate_file_embeddings(resources)
+        self.matrix = self.store.vectors
+        self.chunk_meta = self.store
+        self.ann_index = self.load_or_build_ann_index() if ann and len(self.store) else None
+        self.lexical_index = self.load_or_build_lexical_index() if hybrid and len(self.store) else None
+
+    @property
+    def embedder(self):
+        # only loaded when chunks need embedding or a query comes in
+        return ModelRegistry.embedder(self.embed_model)
+
+    def load_or_build_ann_index(self) -> IVFIndex:
+        n_lists = self.ann_lists or max(1, int(np.sqrt(len(self.store))))
+        if IVFIndex.exists(self.store.path):
+            index = IVFIndex.load(self.store.path)
+            if index.digest == self.store.digest and index.n_lists == min(n_lists, len(self.store)):
+                return index
+        index = IVFIndex.build(self.matrix, n_lists, digest=self.store.digest)
+        index.save(self.store.path)
+        return index
+
+    def load_or_build_lexical_index(self) -> BM25Index:
+        if BM25Index.exists(self.store.path):
+            index = BM25Index.load(self.store.path)
+            if index.digest == self.store.digest:
+                return index
+        index = BM25Index.build((self.store[i]['text'] for i in range(len(self.store))), digest=self.store.digest)
+        index.save(self.store.path)
+        return index
+
+    def get_config_hash(self) -> str:
+        config = f"{self.embed_model}:{self.chunk_size}"
+        return hashlib.sha256(config.encode()).hexdigest()[:16]
+
+    def get_index_name(self, resources: List['Resources']) -> str:
+        # one store per resource set, so tools over different corpora never rewrite each other's
+        paths = "\0".join(sorted(resource.resource_path for resource in resources))
+        return f"file_embeddings_{self.get_config_hash()}_{hashlib.sha256(paths.encode()).hexdigest()[:16]}"
+
+    def get_manifest(self, resources: List['Resources']) -> Dict[str, str]:
+        # a file's chunks depend on its content, the context template and the config
+        return {
+            resource.resource_path: hashlib.sha256(f"{self.get_config_hash()}\0{resource.get_content_hash()}\0{resource.context_template or ''}".encode()).hexdigest()
+            for resource in resources
+        }
 
-    def load_or_generate_file_embeddings(self, resources: List['Resources']) -> Dict[str, List[Dict[str, Any]]]:
-        file_hash = self.get_file_hash(resources)
-        pickle_file = f"file_embeddings_{file_hash}.pickle"
-        if os.path.exists(pickle_file):
-            self.load_embeddings(pickle_file)
-        else:
-            self.file_embeddings = self.generate_file_embeddings(resources)
-            self.save_embeddings(pickle_file)
-        return self.file_embeddings
+    def vector_sources(self, store: Optional[EmbeddingStore] = None) -> List[EmbeddingStore]:
+        # This tool's store first, then every other store built with the same model
+        # and chunk size, so a corpus that gains a document only embeds that document.
+        sources = [store] if store else []
+        directory = os.path.dirname(self.index_name) or "."
+        prefix = f"file_embeddings_{self.get_config_hash()}_"
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.startswith(prefix) and os.path.abspath(path) != os.path.abspath(self.index_name) and EmbeddingStore.exists(path):
+                sources.append(EmbeddingStore(path))
+        return sources
+
+    def get_chunk_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.embed_model}\0{self.chunk_size}\0{text}".encode()).hexdigest()
+
+    def load_or_generate_file_embeddings(self, resources: List['Resources']) -> EmbeddingStore:
+        # The store's manifest holds a hash per file, so an up-to-date store opens
+        # without chunking anything. Otherwise only new or changed files are chunked;
+        # their chunks reuse any vector a compatible store already holds (keyed by a
+        # hash of the chunk text, embed model and chunk size) and only the rest are
+        # embedded. Other tools' stores are only read, never removed.
+        manifest = self.get_manifest(resources)
+        digest = hashlib.sha256(json.dumps([[resource.resource_path, manifest[resource.resource_path]] for resource in resources]).encode()).hexdigest()
+        store = EmbeddingStore(self.index_name) if EmbeddingStore.exists(self.index_name) else None
+        if store and store.digest == digest:
+            return store
+
+        unchanged = {path for path, file_hash in store.manifest.items() if manifest.get(path) == file_hash} if store else set()
+        sources = self.vector_sources(store)
+        known = {}
+        for source in sources:
+            for key, row in source.key_index().items():
+                known.setdefault(key, (source.vectors, row))
+        if store is None:
+            for key, row_vector in self.load_legacy_embeddings(resources).items():
+                known.setdefault(key, row_vector)
+        chunks, keys, missing = [], [], {}
+
+        def missing_batches():
+            batch = []
+            for resource in resources:
+                if resource.resource_path in unchanged:
+                    for row in store.file_rows(resource.resource_path):
+                        chunks.append(store[row])
+                        keys.append(store.keys[row].decode())
+                    continue
+                for chunk in resource.iter_chunks(self.chunk_size):
+                    key = self.get_chunk_key(chunk['text'])
+                    text = resource.contextualize_chunk(chunk)
+                    chunks.append({'text': text, 'start': chunk['start'], 'end': chunk['end'], 'file': resource.resource_path})
+                    keys.append(key)
+                    if key not in known and key not in missing:
+                        missing[key] = len(missing)
+                        batch.append(chunk['text'])
+                        if len(batch) == self.batch_size:
+                            yield batch
+                            batch = []
+            if batch:
+                yield batch
+
+        new_vectors = self.generate_file_embeddings(missing_batches())
+        dim = new_vectors.shape[1] if len(new_vectors) else next((array.shape[1] for array, _ in known.values()), self.embed_dim)
+        vectors = np.empty((len(chunks), dim), dtype=np.float32)
+        for i, key in enumerate(keys):
+            if key in known:
+                array, row = known[key]
+                vectors[i] = array[row]
+            else:
+                vectors[i] = new_vectors[missing[key]]
+
+        written = EmbeddingStore.write(self.index_name, chunks, vectors, keys, digest, manifest)
+        known.clear()
+        for source in sources:
+            source.close()
+        return written
+
+    def load_legacy_embeddings(self, resources: List['Resources']) -> Dict[str, tuple]:
+        # Pickles written before EmbeddingStore were named by the resource paths and
+        # stored each chunk's text with its vector. Their vectors seed a first build
+        # under the usual chunk keys, so upgrading does not re-embed the corpus; text
+        # that was wrapped by a context_template no longer matches and is re-embedded.
+        paths = "".join(sorted(resource.resource_path for resource in resources))
+        pickle_file = os.path.join(os.path.dirname(self.index_name), f"file_embeddings_{hashlib.sha256(paths.encode()).hexdigest()}.pickle")
+        if not os.path.exists(pickle_file):
+            return {}
+        with open(pickle_file, 'rb') as f:
+            file_embeddings = pickle.load(f)
+        chunks = [chunk for chunk_data in file_embeddings.values() for chunk in chunk_data]
+        if not chunks:
+            return {}
+        array = np.asarray([chunk['embedding'] for chunk in chunks], dtype=np.float32)
+        return {self.get_chunk_key(chunk['text']): (array, row) for row, chunk in enumerate(chunks)}
+
+    def generate_file_embeddings(self, batches: Iterable[List[str]]) -> np.ndarray:
+        # Batches are submitted as soon as they are produced, so chunking the next
+        # resource overlaps with embedding the current one.
+        executor = None
+        jobs = []
+        start_time = time.monotonic()
+        try:
+            for batch in batches:
+                if executor is None:
+                    executor = self.make_embed_executor()
+                if self.embed_workers > 1:
+                    jobs.append((len(batch), executor.submit(SemanticFileSearchTool.embed_worker_batch, batch)))
+                else:
+                    jobs.append((len(batch), executor.submit(self.embedder.embed, batch, prefix='search_document')))
+
+            total = sum(size for size, _ in jobs)
+            done = 0
+            results = []
+            for size, job in jobs:
+                results.append(np.asarray(job.result(), dtype=np.float32).reshape(size, -1))
+                done += size
+                if self.verbose:
+                    elapsed = max(time.monotonic() - start_time, 1e-9)
+                    print(f"Embedded {done}/{total} chunks ({done / elapsed:.1f} chunks/s)")
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        if not results:
+            return np.zeros((0, self.embed_dim), dtype=np.float32)
+        return np.concatenate(results)
+
+    def make_embed_executor(self):
+        if self.embed_workers > 1:
+            # each process loads its own Embed4All, one model per core
+            return ProcessPoolExecutor(max_workers=self.embed_workers, initializer=SemanticFileSearchTool.init_embed_worker, initargs=(self.embed_model,))
+        return ThreadPoolExecutor(max_workers=1)
 
-    def get_file_hash(self, resources: List['Resources']) -> str:
-        file_contents = "".join(sorted([resource.resource_path for resource in resources]))
-        return hashlib.sha256(file_contents.encode()).hexdigest()
+    @staticmethod
+    def init_embed_worker(embed_model: str):
+        SemanticFileSearchTool.worker_embedder = ModelRegistry.embedder(embed_model)
 
-    def generate_file_embeddings(self, resources: List['Resources']) -> Dict[str, List[Dict[str, Any]]]:
-        file_embeddings = {}
-        for resource in resources:
-            resource.chunk_resource(self.chunk_size)
-            chunk_embeddings = [self.embedder.embed(chunk['text'], prefix='search_document') for chunk in resource.chunks]
-            file_embeddings[resource.resource_path] = [
-                {
-                    'text': resource.contextualize_chunk(chunk),
-                    'start': chunk['start'],
-                    'end': chunk['end'],
-                    'file': resource.resource_path,
-                    'embedding': embedding
-                }
-                for chunk, embedding in zip(resource.chunks, chunk_embeddings)
-            ]
-        return file_embeddings
+    @staticmethod
+    def embed_worker_batch(texts: List[str]) -> List[List[float]]:
+        return SemanticFileSearchTool.worker_embedder.embed(texts, prefix='search_document')
 
     def search(self, query: str) -> List[Dict[str, Any]]:
-        query_embedding = self.embedder.embed(query, prefix='search_query')
-        scores = []
-        for file_path, chunk_data in self.file_embeddings.items():
-            for chunk in chunk_data:
-                chunk_score = self.cosine_similarity(query_embedding, chunk['embedding'])
-                scores.append((chunk, chunk_score))
-        sorted_scores = sorted(scores, key=lambda x: x[1], reverse=True)
-        top_scores = sorted_scores[:self.top_k]
-        result = []
-        for chunk, score in top_scores:
-            result.append({
-                'file': chunk['file'],
-                'text': chunk['text'],
-                'score': score
-            })
-        return result
+        return self.search_batch([query])[0]
+
+    def search_batch(self, queries: List[str], top_k: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        top_k = top_k or self.top_k
+        if not len(self.chunk_meta):
+            return [[] for _ in queries]
+
+        query_matrix = self.embed_queries(queries)
+        if self.lexical_index is not None:
+            return [self.format_results(ids, scores) for ids, scores in self.rank_hybrid(queries, query_matrix, top_k)]
+        return [self.format_results(ids, scores) for ids, scores in self.rank(query_matrix, top_k)]
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        return self.normalize(np.asarray(self.embedder.embed(queries, prefix='search_query'), dtype=np.float32))
+
+    def rank(self, query_matrix: np.ndarray, top_k: int, exact: bool = False) -> List[tuple]:
+        if self.ann_index is not None and not exact:
+            return self.ann_index.search(self.matrix, query_matrix, top_k, self.nprobe)
+
+        scores = query_matrix @ self.matrix.T
+        k = min(top_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(scores, top):
+            ranked = candidates[np.argsort(-row[candidates])]
+            results.append((ranked, row[ranked]))
+        return results
+
+    def rank_hybrid(self, queries: List[str], query_matrix: np.ndarray, top_k: int) -> List[tuple]:
+        # BM25 picks the candidates, only those rows are scored densely, and the two
+        # rankings are merged with reciprocal rank fusion. Queries without any
+        # indexed term fall back to dense ranking.
+        results = []
+        for query, vector in zip(queries, query_matrix):
+            candidates, _ = self.lexical_index.search(query, max(self.bm25_candidates, top_k))
+            if not len(candidates):
+                results.extend(self.rank(vector[None, :], top_k))
+                continue
+            dense_order = np.argsort(-(np.asarray(self.matrix[candidates]) @ vector))
+            fused = 1.0 / (self.fusion_k + 1 + np.arange(len(candidates)))
+            fused[dense_order] += 1.0 / (self.fusion_k + 1 + np.arange(len(candidates)))
+            k = min(top_k, len(candidates))
+            top = np.argsort(-fused, kind='stable')[:k]
+            results.append((candidates[top], fused[top]))
+        return results
+
+    def format_results(self, ids: np.ndarray, scores: np.ndarray) -> List[Dict[str, Any]]:
+        results = []
+        for i, score in zip(ids, scores):
+            chunk = self.chunk_meta[int(i)]
+            chunk['score'] = float(score)
+            results.append(chunk)
+        return results
+
+    def evaluate_recall(self, queries: Optional[List[str]] = None, k: Optional[int] = None, sample_size: int = 100, seed: int = 0) -> float:
+        # recall@k of the ANN index against exact search; stored chunks are used as
+        # queries when none are given
+        k = k or self.top_k
+        if queries:
+            query_matrix = self.embed_queries(queries)
+        else:
+            rng = np.random.default_rng(seed)
+            rows = np.sort(rng.choice(len(self.store), size=min(sample_size, len(self.store)), replace=False))
+            query_matrix = np.asarray(self.matrix[rows])
+        exact = self.rank(query_matrix, k, exact=True)
+        approx = self.rank(query_matrix, k)
+        hits = [len(set(a[0].tolist()) & set(e[0].tolist())) / max(1, len(e[0])) for a, e in zip(approx, exact)]
+        return float(np.mean(hits)) if hits else 1.0
+
+    @staticmethod
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
 
     def cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        import numpy as np
         a = np.array(a)
         b = np.array(b)
         return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
-    def save_embeddings(self, pickle_file: str):
-        with open(pickle_file, 'wb') as f:
-            pickle.dump(self.file_embeddings, f)
+class SentenceCorpus:
+    # Restartable iterator of tokenised sentences. Resources are read lazily
+    # (text files line by line), so gensim can make several passes over a
+    # corpus that never sits in memory as a whole.
+    sentence_end = re.compile(r'(?<=[.!?])\s+')
 
-    def load_embeddings(self, pickle_file: str):
-        with open(pickle_file, 'rb') as f:
-            self.file_embeddings = pickle.load(f)
+    def __init__(self, resources: List['Resources'], max_sentence_chars: int = 10000):
+        self.resources = resources
+        self.max_sentence_chars = max_sentence_chars
+
+    def __iter__(self):
+        for resource in self.resources:
+            for sentence in self.sentences(resource):
+                tokens = sentence.split()
+                if tokens:
+                    yield tokens
+
+    def sentences(self, resource: 'Resources'):
+        buffer = ""
+        for line in resource.iter_lines():
+            line = line.strip()
+            if not line:
+                if buffer:
+                    yield buffer
+                buffer = ""
+                continue
+            buffer = f"{buffer} {line}" if buffer else line
+            parts = self.sentence_end.split(buffer)
+            yield from parts[:-1]
+            buffer = parts[-1]
+            if len(buffer) > self.max_sentence_chars:
+                yield buffer
+                buffer = ""
+        if buffer:
+            yield buffer
+
+    def spill(self, path: str) -> int:
+        count = 0
+        with open(path, 'w') as f:
+            for tokens in self:
+                f.write(" ".join(tokens) + "\n")
+                count += 1
+        return count
 
 class Word2VecSearchTool:
-    def __init__(self, resources: List['Resources'], embedding_size: int = 100, window: int = 5, min_count: int = 1, workers: int = 4):
+    def __init__(self, resources: List['Resources'], embedding_size: int = 100, window: int = 5, min_count: int = 1, workers: int = 4, chunk_size: Optional[int] = None, epochs: int = 5, corpus_file: Optional[str] = None, model_name: Optional[str] = None):
         self.resources = resources
         self.embedding_size = embedding_size
         self.window = window
         self.min_count = min_count
         self.workers = workers
+        self.chunk_size = chunk_size
+        self.epochs = epochs
+        self.corpus_file = corpus_file
+        self.model_name = model_name or f"word2vec_model_{self.get_model_hash()}"
         self.model = self.load_or_train_model()
+        self.build_index()
 
     def load_or_train_model(self) -> Word2Vec:
-        model_hash = self.get_model_hash()
-        pickle_file = f"word2vec_model_{model_hash}.pickle"
+        # The model is keyed by its settings and resource set; a manifest of resource
+        # content hashes records what it was trained on, so new or changed resources
+        # are trained in incrementally. A set with no model of its own starts from a
+        # copy of the largest sibling model trained on a subset of it.
+        pickle_file = f"{self.model_name}.pickle"
+        manifest_file = f"{self.model_name}.json"
+        current = {resource.resource_path: self.get_resource_hash(resource) for resource in self.resources}
+
         if os.path.exists(pickle_file):
-            return self.load_model(pickle_file)
+            model = self.load_model(pickle_file)
+            trained = self.load_manifest(manifest_file)
         else:
+            model, trained = self.load_base_model(current)
+
+        if model is None:
             model = self.train_model()
-            self.save_model(model, pickle_file)
-            return model
+        else:
+            new_resources = [resource for resource in self.resources if trained.get(resource.resource_path) != current[resource.resource_path]]
+            if not new_resources:
+                return model
+            self.update_model(model, new_resources)
+            current = {**trained, **current}
+
+        # the model first: a crash in between leaves a manifest that under-reports
+        self.save_model(model, pickle_file)
+        self.save_manifest(current, manifest_file)
+        return model
+
+    def get_settings_hash(self) -> str:
+        settings = f"{self.embedding_size},{self.window},{self.min_count}"
+        return hashlib.sha256(settings.encode()).hexdigest()[:16]
 
     def get_model_hash(self) -> str:
-        resource_paths = sorted([resource.resource_path for resource in self.resources])
-        return hashlib.sha256(",".join(resource_paths).encode()).hexdigest()
+        # the resource set is part of the name so unrelated corpora never train into one model
+        paths = "\0".join(sorted(resource.resource_path for resource in self.resources))
+        return f"{self.get_settings_hash()}_{hashlib.sha256(paths.encode()).hexdigest()[:16]}"
+
+    def load_base_model(self, current: Dict[str, str]) -> tuple:
+        # Models with the same settings whose manifest matches part of this resource
+        # set, like SemanticFileSearchTool.vector_sources; the sibling is left as is.
+        directory = os.path.dirname(self.model_name) or "."
+        prefix = f"word2vec_model_{self.get_settings_hash()}_"
+        best, best_manifest = None, {}
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not (name.startswith(prefix) and name.endswith(".json")) or os.path.abspath(path) == os.path.abspath(f"{self.model_name}.json"):
+                continue
+            manifest = self.load_manifest(path)
+            if len(manifest) > len(best_manifest) and all(current.get(resource_path) == file_hash for resource_path, file_hash in manifest.items()) and os.path.exists(f"{path[:-5]}.pickle"):
+                best, best_manifest = path[:-5], manifest
+        if best is None:
+            return None, {}
+        return self.load_model(f"{best}.pickle"), best_manifest
 
-    def train_model(self) -> Word2Vec:
-        corpus = []
-        for resource in self.resources:
-            resource.chunk_resource(chunk_size=1)  # Chunk the resource into individual sentences
-            corpus.extend([chunk['text'] for chunk in resource.chunks])
+    @staticmethod
+    def load_manifest(manifest_file: str) -> Dict[str, str]:
+        try:
+            with open(manifest_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_manifest(self, manifest: Dict[str, str], manifest_file: str):
+        tmp_file = f"{manifest_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_file, manifest_file)
+
+    def get_resource_hash(self, resource: 'Resources') -> str:
+        return resource.get_content_hash()
 
-        model = Word2Vec(LineSentence(corpus), vector_size=self.embedding_size, window=self.window, min_count=self.min_count, workers=self.workers)
-        return model
+    def train_model(self) -> Word2Vec:
+        corpus = SentenceCorpus(self.resources)
+        from gensim.models import Word2Vec
+        settings = dict(vector_size=self.embedding_size, window=self.window, min_count=self.min_count, workers=self.workers, epochs=self.epochs)
+        if self.corpus_file:
+            # a spilled LineSentence file lets gensim's workers read it in parallel on every epoch
+            corpus.spill(self.corpus_file)
+            return Word2Vec(corpus_file=self.corpus_file, **settings)
+        return Word2Vec(sentences=corpus, **settings)
+
+    def update_model(self, model: Word2Vec, resources: List['Resources']):
+        corpus = SentenceCorpus(resources)
+        if self.corpus_file:
+            update_file = f"{self.corpus_file}.update"
+            corpus.spill(update_file)
+            model.build_vocab(corpus_file=update_file, update=True)
+            model.train(corpus_file=update_file, total_words=model.corpus_total_words, epochs=model.epochs)
+        else:
+            model.build_vocab(corpus, update=True)
+            model.train(corpus, total_examples=model.corpus_count, epochs=model.epochs)
 
     def save_model(self, model: Word2Vec, pickle_file: str):
-        with open(pickle_file, 'wb') as f:
+        tmp_file = f"{pickle_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'wb') as f:
             pickle.dump(model, f)
+        os.replace(tmp_file, pickle_file)
 
     def load_model(self, pickle_file: str) -> Word2Vec:
         with open(pickle_file, 'rb') as f:
             return pickle.load(f)
 
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        query_words = query.split()
-        similarities = []
-
+    def iter_index_chunks(self, resource: 'Resources'):
+        # Without a chunk_size the index rows are the same sentences the model was
+        # trained on; start and end are then sentence numbers rather than token offsets.
+        if self.chunk_size is None:
+            for i, sentence in enumerate(SentenceCorpus([resource]).sentences(resource)):
+                yield {'text': sentence, 'start': i, 'end': i + 1}
+        else:
+            resource.chunk_resource(chunk_size=self.chunk_size)
+            yield from resource.chunks
+
+    def build_index(self):
+        # Chunk vectors are the mean of their in-vocabulary word vectors, computed
+        # once and stored as a normalised matrix alongside the chunk metadata.
+        self.chunk_meta = []
+        word_ids, offsets = [], []
         for resource in self.resources:
-            resource.chunk_resource(chunk_size=1)  # Chunk the resource into individual sentences
-            for chunk in resource.chunks:
-                chunk_words = chunk['text'].split()
-                if not chunk_words:
+            for chunk in self.iter_index_chunks(resource):
+                ids = [self.model.wv.key_to_index[word] for word in chunk['text'].split() if word in self.model.wv.key_to_index]
+                if not ids:
                     continue
+                offsets.append(len(word_ids))
+                word_ids.extend(ids)
+                self.chunk_meta.append({'text': chunk['text'], 'start': chunk['start'], 'end': chunk['end'], 'file': resource.resource_path})
+
+        if not offsets:
+            self.matrix = np.zeros((0, self.model.wv.vector_size), dtype=np.float32)
+            return
+        word_ids = np.asarray(word_ids, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        counts = np.diff(np.append(offsets, len(word_ids)))
+        sums = np.add.reduceat(self.model.wv.vectors[word_ids], offsets, axis=0)
+        self.matrix = np.ascontiguousarray(SemanticFileSearchTool.normalize((sums / counts[:, None]).astype(np.float32)))
+
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        vectors = [self.model.wv[word] for word in query.split() if word in self.model.wv]
+        if not vectors:
+            return None
+        query_embedding = np.mean(vectors, axis=0).astype(np.float32)
+        norm = np.linalg.norm(query_embedding)
+        return query_embedding / norm if norm else query_embedding
 
-                chunk_embedding = sum([self.model.wv[word] for word in chunk_words if word in self.model.wv]) / len(chunk_words)
-                query_embedding = sum([self.model.wv[word] for word in query_words if word in self.model.wv]) / len(query_words)
-
-                similarity = self.cosine_similarity(chunk_embedding, query_embedding)
-                similarities.append((chunk, similarity))
-
-        sorted_similarities = sorted(similarities, key=lambda x: x[1], reverse=True)
-        top_chunks = [chunk for chunk, _ in sorted_similarities[:top_k]]
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        query_embedding = self.embed_query(query)
+        if query_embedding is None or not len(self.chunk_meta):
+            return []
 
-        return [
-            {
-                'text': chunk['text'],
-                'start': chunk['start'],
-                'end': chunk['end'],
-                'file': resource.resource_path
-            }
-            for resource, chunk in zip([resource for resource in self.resources for _ in range(len(resource.chunks))], top_chunks)
-        ]
+        scores = self.matrix @ query_embedding
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(self.chunk_meta[i], score=float(scores[i])) for i in top]
 
     @staticmethod
     def cosine_similarity(a, b) -> float:
         return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
+# AGENTS
+
+class ClientPool:
+    # One client per endpoint so every agent shares the same HTTP connection pool.
+    # Async clients are bound to the event loop that created them.
+    _clients: Dict[tuple, OpenAI] = {}
+    _async_clients = weakref.WeakKeyDictionary()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, base_url: str, api_key: str) -> OpenAI:
+        with cls._lock:
+            key = (base_url, api_key)
+            if key not in cls._clients:
+                from openai import OpenAI
+                cls._clients[key] = OpenAI(base_url=base_url, api_key=api_key)
+            return cls._clients[key]
+
+    @classmethod
+    def get_async(cls, base_url: str, api_key: str) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        with cls._lock:
+            clients = cls._async_clients.setdefault(loop, {})
+            key = (base_url, api_key)
+            if key not in clients:
+                from openai import AsyncOpenAI
+                clients[key] = AsyncOpenAI(base_url=base_url, api_key=api_key)
+            return clients[key]
+
+class RateLimiter:
+    # Token bucket holding up to max_rpm requests, refilled continuously over a minute.
+    def __init__(self, max_rpm: int):
+        self.capacity = max_rpm
+        self.rate = max_rpm / 60.0
+        self.tokens = float(max_rpm)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+class ResponseCache:
+    # Completions stored one file per request hash. Writes go through a temp file
+    # and os.replace, so several processes can share the directory safely. An entry's
+    # mtime stays its creation time for max_age; reads bump only the atime, which
+    # orders the size-based eviction.
+    _shared: Dict[str, "ResponseCache"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, cache_dir: str = ".response_cache", max_bytes: int = 256 * 1024 * 1024, max_age: Optional[float] = 30 * 24 * 3600, evict_every: int = 32):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evict_every = evict_every
+        self.writes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def shared(cls, cache_dir: str = ".response_cache") -> "ResponseCache":
+        with cls._lock:
+            if cache_dir not in cls._shared:
+                cls._shared[cache_dir] = cls(cache_dir)
+            return cls._shared[cache_dir]
+
+    def make_key(self, request: Dict[str, Any]) -> str:
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, request: Dict[str, Any]) -> Optional[str]:
+        path = self.path_for(self.make_key(request))
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+            stat = os.stat(path)
+            if self.max_age is not None and time.time() - entry.get("created", stat.st_mtime) > self.max_age:
+                self.remove(path)
+                return None
+            os.utime(path, (time.time(), stat.st_mtime))
+        except (OSError, ValueError):
+            return None
+        return entry["response"]
+
+    def put(self, request: Dict[str, Any], response: str):
+        path = self.path_for(self.make_key(request))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"model": request.get("model"), "response": response, "created": time.time(), "timestamp": datetime.now().isoformat()}, f)
+        os.replace(tmp_path, path)
+
+        self.writes += 1
+        if self.writes % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if self.max_age is not None and now - stat.st_mtime > self.max_age:
+                    self.remove(path)
+                else:
+                    entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
 
+    @staticmethod
+    def remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class LogWriter:
+    # Append-only JSONL sink. Records go through a bounded queue to a writer thread
+    # that writes whatever is queued as one batch, fsyncs per the fsync policy
+    # ("batch", "close" or "never") and rotates the file past max_bytes, keeping
+    # `backups` old segments, gzip-compressed if asked. write() blocks while the
+    # queue is full, so a slow disk applies back-pressure instead of using memory.
+    def __init__(self, path: str, batch_size: int = 256, fsync: str = "batch", max_bytes: Optional[int] = 64 * 1024 * 1024, backups: int = 5, compress: bool = False, queue_size: int = 10000):
+        if fsync not in ("batch", "close", "never"):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.closed = False
+        self.file = open(path, "a", encoding="utf-8")
+        self.thread = threading.Thread(target=self.run, name=f"log-writer {path}", daemon=True)
+        self.thread.start()
+
+    def write(self, record: Dict[str, Any]):
+        if self.error:
+            raise self.error
+        if self.closed:
+            raise ValueError(f"Log {self.path} is closed")
+        self.queue.put(record)
+
+    def flush(self):
+        self.queue.join()
+        if self.error:
+            raise self.error
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not None]
+            stopping = len(records) < len(batch)
+            try:
+                if not self.error:
+                    self.write_batch(records)
+            except Exception as e:
+                self.error = e
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+        try:
+            self.sync()
+        except Exception as e:
+            self.error = self.error or e
+        self.file.close()
+
+    def write_batch(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        self.file.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+        self.file.flush()
+        if self.fsync == "batch":
+            os.fsync(self.file.fileno())
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def sync(self):
+        self.file.flush()
+        if self.fsync != "never":
+            os.fsync(self.file.fileno())
+
+    def rotate(self):
+        self.sync()
+        self.file.close()
+        suffix = ".gz" if self.compress else ""
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}{suffix}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}{suffix}")
+        if self.backups:
+            target = f"{self.path}.1"
+            os.replace(self.path, target)
+            if self.compress:
+                with open(target, "rb") as source, gzip.open(f"{target}.gz", "wb") as compressed:
+                    shutil.copyfileobj(source, compressed)
+                os.remove(target)
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+
+class LRUEviction:
+    # Eviction policies track the cached keys and name the one to drop when a
+    # ToolCache is full. Any object with touch/remove/victim can be plugged in.
+    def __init__(self):
+        self.order = OrderedDict()
+
+    def touch(self, key: Any):
+        self.order[key] = None
+        self.order.move_to_end(key)
+
+    def remove(self, key: Any):
+        self.order.pop(key, None)
+
+    def victim(self) -> Any:
+        return next(iter(self.order))
+
+class FIFOEviction(LRUEviction):
+    def touch(self, key: Any):
+        self.order.setdefault(key, None)
+
+class LFUEviction:
+    def __init__(self):
+        self.counts: Dict[Any, int] = {}
+
+    def touch(self, key: Any):
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def remove(self, key: Any):
+        self.counts.pop(key, None)
+
+    def victim(self) -> Any:
+        # dicts keep insertion order, so ties go to the oldest key
+        return min(self.counts, key=self.counts.get)
+
+class ToolCache:
+    # Memoizes tool calls per (tool, method, exact arguments) for one squad run, so
+    # tasks that give a tool the same input share one execution. Strings are keyed
+    # by their sha1, never a normalised form: NER offsets and sentence breaks
+    # depend on every character.
+    # Concurrent callers of the same key wait for the first one.
+    policies = {"lru": LRUEviction, "fifo": FIFOEviction, "lfu": LFUEviction}
+
+    def __init__(self, max_entries: int = 256, eviction: Any = "lru"):
+        if isinstance(eviction, str):
+            if eviction not in self.policies:
+                raise ValueError(f"Unknown eviction policy: {eviction}")
+            eviction = self.policies[eviction]()
+        self.max_entries = max_entries
+        self.eviction = eviction
+        self.results: Dict[tuple, Any] = {}
+        self.pending: Dict[tuple, threading.Lock] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def key_part(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            return hashlib.sha1(value.encode("utf-8", "surrogatepass")).hexdigest()
+        if isinstance(value, (list, tuple)):
+            return tuple(cls.key_part(item) for item in value)
+        return value
+
+    def call(self, tool: Any, method: str, *args) -> Any:
+        key = (id(tool), method, self.key_part(args))
+        with self.lock:
+            if key in self.results:
+                self.hits += 1
+                self.eviction.touch(key)
+                return self.results[key]
+            key_lock = self.pending.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self.lock:
+                if key in self.results:
+                    self.hits += 1
+                    self.eviction.touch(key)
+                    return self.results[key]
+            result = getattr(tool, method)(*args)
+            with self.lock:
+                self.misses += 1
+                self.results[key] = result
+                self.eviction.touch(key)
+                self.pending.pop(key, None)
+                while len(self.results) > self.max_entries:
+                    victim = self.eviction.victim()
+                    self.eviction.remove(victim)
+                    self.results.pop(victim, None)
+                    self.evictions += 1
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.results)}
+
+class ContextAssembler:
+    # Fits context pieces into a token budget. Pieces are ranked newest first or by
+    # word overlap with a query; the best ones are kept whole, the first one that no
+    # longer fits is summarised or cut to the tokens left, and the rest are dropped.
+    # Kept pieces are joined back in their original order.
+    model_budgets: Dict[str, int] = {}
+    # Ollama's default context window is 2048 tokens; leave room for the prompt and reply
+    default_budget = 1024
+    min_piece_tokens = 32
+
+    def __init__(self, max_tokens: Optional[int] = None, strategy: str = "recency", summarizer: Optional[Callable[[str, int], str]] = None, encoding_name: str = "cl100k_base"):
+        if strategy not in ("recency", "relevance"):
+            raise ValueError(f"Unknown context strategy: {strategy}")
+        self.max_tokens = max_tokens or self.default_budget
+        self.strategy = strategy
+        self.summarizer = summarizer
+        self.chunker = TextChunker(encoding_name=encoding_name)
+
+    @classmethod
+    def for_model(cls, model: str, max_tokens: Optional[int] = None, **kwargs) -> "ContextAssembler":
+        return cls(max_tokens or cls.model_budgets.get(model), **kwargs)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.chunker.encode(text))
+
+    def rank(self, pieces: List[str], query: Optional[str] = None) -> List[int]:
+        order = list(range(len(pieces)))[::-1]
+        if self.strategy == "relevance" and query:
+            words = set(BM25Index.tokenize(query))
+
+            def overlap(i: int) -> float:
+                piece_words = BM25Index.tokenize(pieces[i])
+                return sum(word in words for word in piece_words) / max(1, len(piece_words)) ** 0.5
+            # stable sort, so equally relevant pieces stay newest first
+            order.sort(key=overlap, reverse=True)
+        return order
+
+    def fit(self, text: str, max_tokens: int) -> str:
+        if self.summarizer:
+            text = self.summarizer(text, max_tokens)
+        tokens = self.chunker.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self.chunker.encoding.decode(tokens[:max_tokens].tolist())
+
+    def assemble(self, pieces: List[str], query: Optional[str] = None, separator: str = "\n") -> str:
+        budget = self.max_tokens
+        separator_tokens = self.count_tokens(separator)
+        kept = {}
+        for i in self.rank(pieces, query):
+            cost = self.count_tokens(pieces[i]) + separator_tokens
+            if cost <= budget:
+                kept[i] = pieces[i]
+                budget -= cost
+                continue
+            if budget - separator_tokens >= self.min_piece_tokens:
+                kept[i] = self.fit(pieces[i], budget - separator_tokens)
+            break
+        return separator.join(kept[i] for i in sorted(kept))
 
 class Agent:
     def __init__(
@@ -408,6 +2147,12 @@ class Agent:
         allow_delegation: bool = False,
         input_tasks: Optional[List["Task"]] = None,
         output_tasks: Optional[List["Task"]] = None,
+        base_url: str = 'http://localhost:11434/v1',
+        api_key: str = 'ollama',
+        stream: bool = False,
+        context_tokens: Optional[int] = None,
+        context_strategy: str = "recency",
+        interaction_history: int = 100,
     ):
         self.id = str(uuid.uuid4())
         self.role = role
@@ -424,13 +2169,157 @@ class Agent:
         self.allow_delegation = allow_delegation
         self.input_tasks = input_tasks or []
         self.output_tasks = output_tasks or []
-        self.interactions = []
-        self.client = OpenAI(
-            base_url='http://localhost:11434/v1',
-            api_key='ollama',
-        )
+        # only the latest interactions are kept here; listeners see every one
+        self.interactions = deque(maxlen=interaction_history)
+        self.interaction_listeners: List[Callable] = []
+        # set by a running Squad so tool results are shared with its logging
+        self.tool_cache: Optional[ToolCache] = None
+        self.base_url = base_url
+        self.api_key = api_key
+        self.stream = stream
+        self.client = ClientPool.get(base_url, api_key)
+        self.rate_limiter = RateLimiter(max_rpm) if max_rpm else None
+        self.response_cache = ResponseCache.shared() if cache else None
+        self.context_assembler = ContextAssembler.for_model(model, context_tokens, strategy=context_strategy)
 
     def execute_task(self, task: "Task", context: Optional[str] = None) -> str:
+        messages = self.build_messages(task, context)
+        request = {"model": self.model, "messages": messages}
+        # the same model name on another server is a different model
+        cache_key = {"base_url": self.base_url, **request}
+
+        if self.response_cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return self.complete_task(task, messages, cached, cached=True)
+
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+
+        # the client timeout applies per read, so streams also check a total deadline
+        deadline = time.monotonic() + self.max_execution_time if self.max_execution_time else None
+        with Tracer.span("completion", agent=self.role, model=self.model, stream=self.stream) as span:
+            if self.stream:
+                stream = self.bounded_client(deadline).chat.completions.create(**request, stream=True, stream_options={"include_usage": True})
+                result = self.consume_stream(task, stream, span, deadline)
+            else:
+                response = self.bounded_client(deadline).chat.completions.create(**request)
+                result = response.choices[0].message.content
+                self.record_usage(span, response)
+
+        if self.response_cache:
+            self.response_cache.put(cache_key, result)
+        return self.complete_task(task, messages, result, streamed=self.stream)
+
+    async def execute_task_async(self, task: "Task", context: Optional[str] = None) -> str:
+        messages = await asyncio.to_thread(self.build_messages, task, context)
+        request = {"model": self.model, "messages": messages}
+        # the same model name on another server is a different model
+        cache_key = {"base_url": self.base_url, **request}
+
+        # cache lookups, writes and eviction are file I/O, kept off the event loop
+        if self.response_cache:
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None:
+                return self.complete_task(task, messages, cached, cached=True)
+
+        if self.rate_limiter:
+            await self.rate_limiter.acquire_async()
+
+        client = ClientPool.get_async(self.base_url, self.api_key)
+        # wait_for cancels the in-flight request once max_execution_time runs out
+        with Tracer.span("completion", agent=self.role, model=self.model, stream=self.stream) as span:
+            if self.stream:
+                result = await asyncio.wait_for(self.consume_stream_async(task, client, request, span), timeout=self.max_execution_time)
+            else:
+                response = await asyncio.wait_for(client.chat.completions.create(**request), timeout=self.max_execution_time)
+                result = response.choices[0].message.content
+                self.record_usage(span, response)
+
+        if self.response_cache:
+            await asyncio.to_thread(self.response_cache.put, cache_key, result)
+        return self.complete_task(task, messages, result, streamed=self.stream)
+
+    def bounded_client(self, deadline: Optional[float]):
+        # A limited call gets no client retries and at most the time left, since each
+        # retry would start a fresh timeout.
+        if deadline is None:
+            return self.client
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"{self.role} exceeded max_execution_time of {self.max_execution_time}s")
+        return self.client.with_options(timeout=remaining, max_retries=0)
+
+    @staticmethod
+    def record_usage(span: Any, response):
+        usage = getattr(response, "usage", None)
+        if usage:
+            span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+
+    def record_stream_usage(self, span: Any, task: "Task", usage_chunk):
+        # the final chunk carries usage when the server honours include_usage;
+        # otherwise only the completion side is known, counted from the deltas
+        if usage_chunk is not None:
+            self.record_usage(span, usage_chunk)
+        else:
+            span.set(completion_tokens=len(task.output_parts))
+
+    def consume_stream(self, task: "Task", stream, span: Any, deadline: Optional[float] = None) -> str:
+        task.begin_stream()
+        completed = False
+        usage_chunk = None
+        try:
+            for chunk in stream:
+                if deadline is not None and time.monotonic() > deadline:
+                    stream.close()
+                    raise TimeoutError(f"{self.role} exceeded max_execution_time of {self.max_execution_time}s")
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self.emit_delta(task, chunk.choices[0].delta.content)
+                if getattr(chunk, "usage", None):
+                    usage_chunk = chunk
+            completed = True
+        finally:
+            task.end_stream(completed)
+        self.record_stream_usage(span, task, usage_chunk)
+        return task.partial_output
+
+    async def consume_stream_async(self, task: "Task", client: AsyncOpenAI, request: Dict[str, Any], span: Any) -> str:
+        task.begin_stream()
+        completed = False
+        usage_chunk = None
+        try:
+            stream = await client.chat.completions.create(**request, stream=True, stream_options={"include_usage": True})
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self.emit_delta(task, chunk.choices[0].delta.content)
+                if getattr(chunk, "usage", None):
+                    usage_chunk = chunk
+            completed = True
+        finally:
+            task.end_stream(completed)
+        self.record_stream_usage(span, task, usage_chunk)
+        return task.partial_output
+
+    def prewarm(self, keep_alive: str = "10m") -> threading.Thread:
+        # Ollama loads a model on a generate request without a prompt; servers that
+        # do not know the endpoint just answer with an error, which is ignored.
+        url = urljoin(self.base_url.rstrip('/') + '/', '../api/generate')
+
+        def load():
+            try:
+                requests.post(url, json={"model": self.model, "keep_alive": keep_alive}, timeout=self.max_execution_time or 300)
+            except requests.RequestException:
+                pass
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        return thread
+
+    def emit_delta(self, task: "Task", delta: str):
+        task.write_delta(delta)
+        if self.step_callback:
+            self.step_callback(task, delta)
+
+    def build_messages(self, task: "Task", context: Optional[str] = None) -> List[Dict[str, str]]:
         messages = []
 
         if self.persona and self.verbose:
@@ -449,51 +2338,85 @@ class Agent:
 
         if task.tool_name in self.tools:
             tool = self.tools[task.tool_name]
+            with Tracer.span("tool", agent=self.role, tool=task.tool_name, kind=type(tool).__name__) as span:
+                thoughts = self.use_tool(task, tool, context)
+                span.set(results=len(thoughts))
 
-            if isinstance(tool, (TextReaderTool, WebScraperTool)):
-                text_chunks = tool.read_text() if isinstance(tool, TextReaderTool) else tool.scrape_text()
-                for chunk in text_chunks:
-                    thoughts.append(chunk['text'])
-            elif isinstance(tool, (SemanticFileSearchTool, Word2VecSearchTool)):
-                query = "\n".join([c.output for c in task.context if c.output])
-                relevant_chunks = tool.search(query)
-                for chunk in relevant_chunks:
-                    chunk_text = f"File: {chunk['file']}\nText: {chunk['text']}\nRelevance: {chunk['score']:.3f}"
-                    thoughts.append(chunk_text)
-
-            elif isinstance(tool, SemanticAnalysisTool):
-                sentiment_result = tool.analyze_sentiment()
-                thoughts.append(f"Sentiment Analysis Result: {sentiment_result}")
-
-            elif isinstance(tool, NERExtractionTool):
-                entities = tool.extract_entities(context)
-                thoughts.append(f"Extracted Entities: {entities}")
         if thoughts:
             thoughts_prompt = "\n".join([thought for thought in thoughts])
             messages.append({"role": "user", "content": f"{thoughts_prompt}"})
         else:
             messages.append({"role": "user", "content": "No additional relevant information found."})
 
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-        )
-        result = response.choices[0].message.content
-        self.log_interaction(messages, result)
+        return messages
 
-        if self.step_callback:
+    def call_tool(self, tool: Any, method: str, *args) -> Any:
+        if self.tool_cache is not None:
+            return self.tool_cache.call(tool, method, *args)
+        return getattr(tool, method)(*args)
+
+    def call_task_tool(self, task: "Task", tool: Any, method: str, *args) -> Any:
+        # kept on the task so the squad logs the result the prompt was built from
+        result = self.call_tool(tool, method, *args)
+        task.tool_results[method] = result
+        return result
+
+    def use_tool(self, task: "Task", tool: Any, context: Optional[str] = None) -> List[str]:
+        thoughts = []
+        task.tool_results = {}
+
+        if isinstance(tool, (TextReaderTool, WebScraperTool)):
+            text_chunks = self.call_task_tool(task, tool, 'read_text' if isinstance(tool, TextReaderTool) else 'scrape_text')
+            for chunk in text_chunks:
+                thoughts.append(chunk['text'])
+        elif isinstance(tool, (SemanticFileSearchTool, Word2VecSearchTool)):
+            query = self.context_assembler.assemble([c.output for c in task.finished_context()], query=task.instructions)
+            relevant_chunks = self.call_task_tool(task, tool, 'search', query)
+            for chunk in relevant_chunks:
+                chunk_text = f"File: {chunk['file']}\nText: {chunk['text']}\nRelevance: {chunk['score']:.3f}"
+                thoughts.append(chunk_text)
+
+        elif isinstance(tool, SemanticAnalysisTool):
+            sources = [c for c in task.context if c.output]
+            if sources:
+                sentiment = self.call_task_tool(task, tool, 'analyze_sentiment_batch', [c.output for c in sources])
+                for source, score in zip(sources, sentiment['scores']):
+                    thoughts.append(f"Sentiment of {source.agent.role}: {score}")
+                thoughts.append(f"Sentiment Analysis Result: {sentiment['aggregate']}")
+            else:
+                thoughts.append(f"Sentiment Analysis Result: {self.call_task_tool(task, tool, 'analyze_sentiment', context)}")
+
+        elif isinstance(tool, NERExtractionTool):
+            entities = self.call_task_tool(task, tool, 'extract_entities', context)
+            thoughts.append(f"Extracted Entities: {entities}")
+
+        return thoughts
+
+    def complete_task(self, task: "Task", messages: List[Dict[str, str]], result: str, cached: bool = False, streamed: bool = False) -> str:
+        self.log_interaction(messages, result, cached, task)
+
+        # streamed completions already reported every delta to step_callback
+        if self.step_callback and not streamed:
             self.step_callback(task, result)
 
         return result
 
-    def log_interaction(self, prompt, response):
-        self.interactions.append({
+    def log_interaction(self, prompt, response, cached: bool = False, task: Optional["Task"] = None):
+        interaction = {
             "prompt": prompt,
             "response": response,
+            "cached": cached,
+            "task_id": task.id if task else None,
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        self.interactions.append(interaction)
+        for listener in list(self.interaction_listeners):
+            listener(self, interaction)
 
 class Task:
+    # shared by every task, so completion order holds across agents and threads
+    completions = count()
+
     def __init__(
         self,
         instructions: str,
@@ -523,37 +2446,91 @@ class Task:
         self.input_tasks = input_tasks or []
         self.output_tasks = output_tasks or []
         self.prompt_data = []
+        self.output_parts = []
+        self.stream_file = None
+        self.streamed = False
+        self.tool_results = {}
+        self.completed_seq = -1
 
     def execute(self, context: Optional[str] = None) -> str:
         if not self.agent:
             raise Exception("No agent assigned to the task.")
 
-        context_tasks = [task for task in self.context if task.output]
+        with Tracer.span("task", task_id=self.id, agent=self.agent.role, model=self.agent.model):
+            context = self.prepare_context(context)
+            result = self.agent.execute_task(self, context)
+            return self.complete(result)
+
+    async def execute_async(self, context: Optional[str] = None) -> str:
+        if not self.agent:
+            raise Exception("No agent assigned to the task.")
+
+        # tokenizing the context and writing output_file block, so they run in threads
+        with Tracer.span("task", task_id=self.id, agent=self.agent.role, model=self.agent.model):
+            context = await asyncio.to_thread(self.prepare_context, context)
+            result = await self.agent.execute_task_async(self, context)
+            return await asyncio.to_thread(self.complete, result)
+
+    def finished_context(self) -> List["Task"]:
+        # context tasks with output in the order they finished, which is what the
+        # "recency" strategy ranks by; Task.context order says nothing about that
+        return sorted((task for task in self.context if task.output), key=lambda task: task.completed_seq)
+
+    def prepare_context(self, context: Optional[str] = None) -> Optional[str]:
+        assembler = self.agent.context_assembler
+        context_tasks = self.finished_context()
         if context_tasks:
-            self.context_agent_role = context_tasks[0].agent.role
-            original_context = "\n".join([f"{task.agent.role}: {task.output}" for task in context_tasks])
+            self.context_agent_role = next(task for task in self.context if task.output).agent.role
 
             if self.tool_name == 'semantic_search':
-                query = "\n".join([task.output for task in context_tasks])
-                context = query
+                context = assembler.assemble([task.output for task in context_tasks], query=self.instructions)
             else:
-                context = original_context
+                context = assembler.assemble([f"{task.agent.role}: {task.output}" for task in context_tasks], query=self.instructions)
+        elif context:
+            context = assembler.assemble([context])
 
         prompt_details = self.prepare_prompt(context)
         self.prompt_data.append(prompt_details)
+        return context
 
-        result = self.agent.execute_task(self, context)
+    def complete(self, result: str) -> str:
         self.output = result
+        self.completed_seq = next(Task.completions)
 
-        if self.output_file:
+        if self.output_file and not self.streamed:
             with open(self.output_file, "w") as file:
                 file.write(result)
+        self.streamed = False
 
         if self.callback:
             self.callback(self)
 
         return result
 
+    @property
+    def partial_output(self) -> str:
+        return "".join(self.output_parts)
+
+    def begin_stream(self):
+        self.output_parts = []
+        self.streamed = False
+        if self.output_file:
+            self.stream_file = open(self.output_file, "w")
+
+    def write_delta(self, delta: str):
+        self.output_parts.append(delta)
+        if self.stream_file:
+            # flushed per delta so readers of output_file can follow along
+            self.stream_file.write(delta)
+            self.stream_file.flush()
+
+    def end_stream(self, completed: bool = True):
+        if self.stream_file:
+            self.stream_file.close()
+            self.stream_file = None
+        # a dropped stream leaves output_file to be rewritten by the next complete()
+        self.streamed = completed
+
     def prepare_prompt(self, context):
         prompt = {
             "timestamp": datetime.now().isoformat(),
@@ -565,76 +2542,302 @@ class Task:
         return prompt
 
 class Squad:
-    def __init__(self, agents: List['Agent'], tasks: List['Task'], verbose: bool = False, log_file: str = "squad_log.json"):
+    def __init__(self, agents: List['Agent'], tasks: List['Task'], verbose: bool = False, log_file: str = "squad_log.jsonl", max_workers: int = 1, schedule: str = "list", prewarm: bool = False, interaction_log: Optional[str] = None, log_options: Optional[Dict[str, Any]] = None, tool_cache_options: Optional[Dict[str, Any]] = None):
+        if schedule not in ("list", "model_affinity"):
+            raise ValueError(f"Unknown schedule: {schedule}")
         self.id = str(uuid.uuid4())
         self.agents = agents
         self.tasks = tasks
         self.verbose = verbose
         self.log_file = log_file
-        self.log_data = []
-        self.llama_logs = []
+        self.max_workers = max_workers
+        self.schedule = schedule
+        self.prewarm = prewarm
+        self.model_swaps_avoided = 0
+        self.interaction_log = interaction_log
+        # keyword arguments for both LogWriters (fsync, max_bytes, backups, compress, ...)
+        self.log_options = log_options or {}
+        self.log_writer = None
+        self.interaction_writer = None
+        # keyword arguments for the per-run ToolCache (max_entries, eviction)
+        self.tool_cache_options = tool_cache_options or {}
+        self.tool_cache = None
 
     def run(self, inputs: Optional[Dict[str, Any]] = None) -> str:
+        if self.max_workers > 1:
+            return self.run_parallel(inputs)
+
+        # Tasks run one at a time in plan order (list order unless a schedule reorders
+        # them) and each sees the history of the tasks that ran before it. Logs and the
+        # returned context follow list order, as in run_parallel and run_async.
+        self.begin_run()
+        plan = []
+        try:
+            context = ""
+            history = []
+            done = set()
+            started = {}
+            next_commit = 0
+            plan = self.plan_tasks()
+            for position, task in enumerate(plan):
+                if self.verbose:
+                    print(f"Starting Task:\n{task.instructions}")
+
+                # only useful when the server can keep both models resident, so the
+                # next weights load while this task generates
+                if self.prewarm and position + 1 < len(plan) and plan[position + 1].agent.model != task.agent.model:
+                    plan[position + 1].agent.prewarm()
+
+                # each task only sees the part of the history that fits its agent's budget
+                started[task.id] = datetime.now().isoformat()
+                task.output = task.execute(context=task.agent.context_assembler.assemble(history, query=task.instructions))
+                history.append(f"Task:\n{task.instructions}\nOutput:\n{task.output}\n\n")
+                done.add(task.id)
+
+                while next_commit < len(self.tasks) and self.tasks[next_commit].id in done:
+                    committed = self.tasks[next_commit]
+                    next_commit += 1
+                    context = self.record_task(committed, started[committed.id], context)
+
+            return context
+        finally:
+            self.log_schedule(plan)
+            self.end_run()
+
+    def run_parallel(self, inputs: Optional[Dict[str, Any]] = None) -> str:
+        # Tasks only see the outputs of the tasks listed in their own context, so
+        # independent tasks can run side by side. Results are committed in list
+        # order to keep the logs and the returned context identical to run().
+        self.begin_run()
+        order = []
+        try:
+            dependencies = self.build_task_graph()
+            done = set()
+            pending = list(self.tasks)
+            running = {}
+            started = {}
+            context = ""
+            next_commit = 0
+            prewarmed = None
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while next_commit < len(self.tasks):
+                    while len(running) < self.max_workers:
+                        task = self.next_task(pending, done, dependencies, list(running.values()), order)
+                        if task is None:
+                            break
+                        if self.verbose:
+                            print(f"Starting Task:\n{task.instructions}")
+                        pending.remove(task)
+                        order.append(task)
+                        started[task.id] = datetime.now().isoformat()
+                        running[executor.submit(task.execute)] = task
+
+                    prewarmed = self.prewarm_waiting(pending, done, dependencies, list(running.values()), prewarmed)
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        task = running.pop(future)
+                        task.output = future.result()
+                        done.add(task.id)
+
+                    while next_commit < len(self.tasks) and self.tasks[next_commit].id in done:
+                        task = self.tasks[next_commit]
+                        next_commit += 1
+                        context = self.record_task(task, started[task.id], context)
+
+            return context
+        finally:
+            self.log_schedule(order)
+            self.end_run()
+
+    async def run_async(self, inputs: Optional[Dict[str, Any]] = None) -> str:
+        # Same scheduling as run_parallel, but tasks are coroutines so up to
+        # max_workers agent calls can be in flight without a thread each. A failed
+        # task's error is raised before any of its dependents is started.
+        dependencies = self.build_task_graph()
+        self.begin_run()
+        done = set()
+        pending = list(self.tasks)
+        running = {}
+        started = {}
+        order = []
         context = ""
-        for task in self.tasks:
-            if self.verbose:
-                print(f"Starting Task:\n{task.instructions}")
+        next_commit = 0
+        prewarmed = None
+        try:
+            while next_commit < len(self.tasks):
+                while len(running) < max(1, self.max_workers):
+                    task = self.next_task(pending, done, dependencies, list(running.values()), order)
+                    if task is None:
+                        break
+                    if self.verbose:
+                        print(f"Starting Task:\n{task.instructions}")
+                    pending.remove(task)
+                    order.append(task)
+                    started[task.id] = datetime.now().isoformat()
+                    running[asyncio.create_task(task.execute_async())] = task
+
+                prewarmed = self.prewarm_waiting(pending, done, dependencies, list(running.values()), prewarmed)
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for job in finished:
+                    task = running.pop(job)
+                    task.output = job.result()
+                    done.add(task.id)
+
+                while next_commit < len(self.tasks) and self.tasks[next_commit].id in done:
+                    task = self.tasks[next_commit]
+                    next_commit += 1
+                    context = await asyncio.to_thread(self.record_task, task, started[task.id], context)
+        finally:
+            for job in running:
+                job.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            await asyncio.to_thread(self.log_schedule, order)
+            await asyncio.to_thread(self.end_run)
 
-            self.log_data.append({
-                "timestamp": datetime.now().isoformat(),
-                "type": "input",
-                "agent_role": task.agent.role,
-                "task_name": task.instructions,
-                "task_id": task.id,
-                "content": task.instructions
-            })
+        return context
 
-            output = task.execute(context=context)
-            task.output = output
+    def record_task(self, task: 'Task', started: str, context: str) -> str:
+        self.log_event({
+            "timestamp": started,
+            "type": "input",
+            "agent_role": task.agent.role,
+            "task_name": task.instructions,
+            "task_id": task.id,
+            "content": task.instructions
+        })
 
-            if self.verbose:
-                print(f"Task output:\n{output}\n")
+        if self.verbose:
+            print(f"Task output:\n{task.output}\n")
 
-            self.log_data.append({
-                "timestamp": datetime.now().isoformat(),
-                "type": "output",
-                "agent_role": task.agent.role,
-                "task_name": task.instructions,
-                "task_id": task.id,
-                "content": output
-            })
+        self.log_event({
+            "timestamp": datetime.now().isoformat(),
+            "type": "output",
+            "agent_role": task.agent.role,
+            "task_name": task.instructions,
+            "task_id": task.id,
+            "content": task.output
+        })
 
-            self.llama_logs.extend(task.agent.interactions)
+        context += f"Task:\n{task.instructions}\nOutput:\n{task.output}\n\n"
 
-            context += f"Task:\n{task.instructions}\nOutput:\n{output}\n\n"
+        self.handle_tool_logic(task, context)
 
-            self.handle_tool_logic(task, context)
+        return context
 
-        self.save_logs()
-        self.save_llama_logs()
+    def plan_tasks(self) -> List['Task']:
+        # The order run() executes tasks in, one at a time. "list" keeps the tasks as
+        # given, without resolving Task.context into a dependency graph.
+        if self.schedule == "list":
+            return list(self.tasks)
+        dependencies = self.build_task_graph()
+        done = set()
+        pending = list(self.tasks)
+        plan = []
+        while pending:
+            task = self.next_task(pending, done, dependencies, [], plan)
+            pending.remove(task)
+            done.add(task.id)
+            plan.append(task)
+        return plan
+
+    def next_task(self, pending: List['Task'], done: set, dependencies: Dict[str, List['Task']], running: List['Task'], order: List['Task']) -> Optional['Task']:
+        # The earliest dependency-ready task in list order. "model_affinity" only
+        # admits tasks on the running tasks' model, waiting for that group to drain
+        # before switching, and then keeps the last model while it has ready tasks,
+        # so a local server evicts and reloads weights as rarely as possible.
+        ready = [task for task in pending if all(dep.id in done for dep in dependencies[task.id])]
+        if self.schedule == "list" or not ready:
+            return ready[0] if ready else None
+        if running:
+            return next((task for task in ready if task.agent.model == running[0].agent.model), None)
+        model = order[-1].agent.model if order else None
+        return next((task for task in ready if task.agent.model == model), ready[0])
+
+    def prewarm_waiting(self, pending: List['Task'], done: set, dependencies: Dict[str, List['Task']], running: List['Task'], prewarmed: Optional[str]) -> Optional[str]:
+        # A ready task held back while other models run (the running group draining
+        # under "model_affinity", or every worker busy) gets its model loaded now, so
+        # the switch does not wait for the weights. Returns the last model warmed.
+        if not self.prewarm or not running:
+            return prewarmed
+        running_models = {task.agent.model for task in running}
+        waiting = next((task for task in pending if task.agent.model not in running_models and all(dep.id in done for dep in dependencies[task.id])), None)
+        if waiting is None or waiting.agent.model == prewarmed:
+            return prewarmed
+        waiting.agent.prewarm()
+        return waiting.agent.model
+
+    def log_schedule(self, order: List['Task']):
+        # swaps are counted over the order tasks actually started in, against the
+        # same tasks in list order
+        if self.schedule == "list":
+            return
+        started = {task.id for task in order}
+        self.model_swaps_avoided = self.count_model_swaps([task for task in self.tasks if task.id in started]) - self.count_model_swaps(order)
+        self.log_event({
+            "timestamp": datetime.now().isoformat(),
+            "type": "schedule",
+            "schedule": self.schedule,
+            "task_ids": [task.id for task in order],
+            "model_swaps": self.count_model_swaps(order),
+            "model_swaps_avoided": self.model_swaps_avoided
+        })
+        if self.verbose:
+            print(f"Model affinity schedule avoided {self.model_swaps_avoided} model swaps")
 
-        return context
+    @staticmethod
+    def count_model_swaps(tasks: List['Task']) -> int:
+        return sum(1 for previous, task in zip(tasks, tasks[1:]) if previous.agent.model != task.agent.model)
+
+    def build_task_graph(self) -> Dict[str, List['Task']]:
+        task_ids = {task.id for task in self.tasks}
+        dependencies = {task.id: [dep for dep in task.context if dep.id in task_ids] for task in self.tasks}
+        dependents = {task.id: [] for task in self.tasks}
+        in_degree = {task.id: len(dependencies[task.id]) for task in self.tasks}
+        for task in self.tasks:
+            for dep in dependencies[task.id]:
+                dependents[dep.id].append(task)
+
+        ready = [task for task in self.tasks if in_degree[task.id] == 0]
+        visited = 0
+        while ready:
+            task = ready.pop()
+            visited += 1
+            for dependent in dependents[task.id]:
+                in_degree[dependent.id] -= 1
+                if in_degree[dependent.id] == 0:
+                    ready.append(dependent)
+
+        if visited < len(self.tasks):
+            cycle = [task.instructions for task in self.tasks if in_degree[task.id] > 0]
+            raise ValueError(f"Task dependency cycle detected between: {cycle}")
+
+        return dependencies
 
     def handle_tool_logic(self, task, context):
+        # Logs the tool results the agent recorded while building its prompt, so
+        # each tool runs once per task and the log shows what the model was given.
         if task.tool_name in task.agent.tools:
             tool = task.agent.tools[task.tool_name]
             if isinstance(tool, (TextReaderTool, WebScraperTool, SemanticFileSearchTool)):
                 text_chunks = self.handle_specific_tool(task, tool)
                 for i, chunk in enumerate(text_chunks, start=1):
-                    self.log_data.append({
+                    # the text itself stays in the resource; file and token span locate it
+                    self.log_event({
                         "timestamp": datetime.now().isoformat(),
                         "type": "text_chunk",
                         "task_id": task.id,
                         "chunk_id": i,
-                        "text": chunk['text'],
+                        "file": chunk.get('file', ''),
                         "start": chunk.get('start', 0),
                         "end": chunk.get('end', len(chunk['text'])),
-                        "file": chunk.get('file', '')
+                        "chars": len(chunk['text']),
+                        "sha1": hashlib.sha1(chunk['text'].encode('utf-8', 'surrogatepass')).hexdigest()
                     })
 
-            if isinstance(tool, SemanticAnalysisTool):
-                sentiment_result = tool.analyze_sentiment(task.output)
-                self.log_data.append({
+            if isinstance(tool, SemanticAnalysisTool) and task.tool_results:
+                sentiment_result = task.tool_results.get('analyze_sentiment_batch', task.tool_results.get('analyze_sentiment'))
+                self.log_event({
                     "timestamp": datetime.now().isoformat(),
                     "type": "sentiment_analysis",
                     "task_id": task.id,
@@ -642,9 +2845,9 @@ class Squad:
                 })
                 context += f"Sentiment Analysis Result: {sentiment_result}\n\n"
 
-            if isinstance(tool, NERExtractionTool):
-                entities = tool.extract_entities(task.output)
-                self.log_data.append({
+            if isinstance(tool, NERExtractionTool) and 'extract_entities' in task.tool_results:
+                entities = task.tool_results['extract_entities']
+                self.log_event({
                     "timestamp": datetime.now().isoformat(),
                     "type": "ner_extraction",
                     "task_id": task.id,
@@ -654,18 +2857,52 @@ class Squad:
 
     def handle_specific_tool(self, task, tool):
         if isinstance(tool, SemanticFileSearchTool):
-            query = "\n".join([c.output for c in task.context if c.output])
-            return tool.search(query)
+            return task.tool_results.get('search', [])
         else:
-            return tool.read_text() if isinstance(tool, TextReaderTool) else tool.scrape_text()
-
-    def save_llama_logs(self):
-        with open(("qa_interactions" + datetime.now().strftime("%Y%m%d%H%M%S") + ".json"), "w") as file:
-            json.dump(self.llama_logs, file, indent=2)
-
-    def save_logs(self):
-        with open(self.log_file, "w") as file:
-            json.dump(self.log_data, file, indent=2)
+            return task.tool_results.get('read_text' if isinstance(tool, TextReaderTool) else 'scrape_text', [])
+
+    def begin_run(self):
+        # Records are streamed to disk while the squad runs, so a crash keeps
+        # everything logged up to that point. Tool results are memoized per run.
+        if self.log_writer is not None:
+            return
+        interaction_log = self.interaction_log or ("qa_interactions" + datetime.now().strftime("%Y%m%d%H%M%S") + ".jsonl")
+        self.log_writer = LogWriter(self.log_file, **self.log_options)
+        self.interaction_writer = LogWriter(interaction_log, **self.log_options)
+        self.tool_cache = ToolCache(**self.tool_cache_options)
+        for agent in self.squad_agents():
+            agent.interaction_listeners.append(self.record_interaction)
+            agent.tool_cache = self.tool_cache
+
+    def end_run(self):
+        if self.log_writer is None:
+            return
+        for agent in self.squad_agents():
+            if self.record_interaction in agent.interaction_listeners:
+                agent.interaction_listeners.remove(self.record_interaction)
+            if agent.tool_cache is self.tool_cache:
+                agent.tool_cache = None
+        self.log_event({"timestamp": datetime.now().isoformat(), "type": "tool_cache", **self.tool_cache.stats()})
+        self.tool_cache = None
+        log_writer, interaction_writer = self.log_writer, self.interaction_writer
+        self.log_writer = self.interaction_writer = None
+        try:
+            log_writer.close()
+        finally:
+            interaction_writer.close()
+
+    def squad_agents(self) -> List['Agent']:
+        agents = {agent.id: agent for agent in self.agents}
+        agents.update((task.agent.id, task.agent) for task in self.tasks if task.agent)
+        return list(agents.values())
+
+    def log_event(self, record: Dict[str, Any]):
+        if self.log_writer is not None:
+            self.log_writer.write(record)
+
+    def record_interaction(self, agent: 'Agent', interaction: Dict[str, Any]):
+        # called once per completion, so every interaction is written exactly once
+        self.interaction_writer.write({"agent_id": agent.id, "agent_role": agent.role, "model": agent.model, **interaction})
 
 def mainflow():
 
@@ -733,7 +2970,8 @@ def mainflow():
         role='Summarizer',
         persona="""You are a skilled Data Analyst with a knack for distilling complex streams of thought into factual information as dense summaries. """,
         goal='Compile a summary report based on the extracted information. Facts start as thoughts, and thoughts are the seeds your next action. Provide 1500~ words of summary.',
-        verbose=True
+        verbose=True,
+        stream=True
     )
 
     entity_extractor = Agent(
@@ -836,11 +3074,35 @@ def mainflow():
         agents=[researcher, web_analyzer, planner, mermaid, summarizer, semantic_searcher, vibe_check, entity_extractor, mermaid],
         tasks=[txt_task, web_task, system_plan, firstMERMAID, summary, search_task, vibes, ner_task, finalMERMAID],
         verbose=True,
-        log_file="squad_goals" + datetime.now().strftime("%Y%m%d%H%M%S") + ".json"
+        log_file="squad_goals" + datetime.now().strftime("%Y%m%d%H%M%S") + ".jsonl",
+        max_workers=4,
+        schedule="model_affinity"
     )
 
     result = squad.run()
     print(f"Final output:\n{result}")
 
+def measure_startup(runs: int = 5) -> Dict[str, float]:
+    # Import time of this module in fresh interpreters, so import-time regressions show up.
+    script = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script], cwd=src_dir, capture_output=True, text=True, check=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    timings.sort()
+    return {"runs": runs, "min_s": timings[0], "median_s": timings[len(timings) // 2], "max_s": timings[-1]}
+
 if __name__ == "__main__":
-    mainflow()
+    if "--startup-time" in sys.argv:
+        print(json.dumps(measure_startup(), indent=2))
+    else:
+        if "--trace" in sys.argv:
+            Tracer.enable()
+        try:
+            mainflow()
+        finally:
+            if Tracer.enabled:
+                stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+                Tracer.export_jsonl(f"trace{stamp}.jsonl")
+                Tracer.export_chrome(f"trace{stamp}.json")